@@ -0,0 +1,456 @@
+"""
+End-to-end load benchmark for the chat backend
+
+Boots the real FastAPI app under uvicorn on a loopback port, with MongoDB
+replaced by mongomock-motor and OpenAI by a fake server (also on loopback,
+with a configurable delay). It then drives two kinds of traffic at once:
+
+- N WebSocket clients in each of R rooms on /ws/{room_id}. Every client
+  sends messages and receives the whole room's fan-out.
+- A weighted HTTP mix against /private, /contacts, /auth, /media and /ai.
+
+The report is JSON: throughput plus p50/p95/p99 latency per endpoint and for
+WebSocket delivery. Each metric is checked against the limits in
+thresholds.json, and the exit status is 1 if any limit is broken, so CI can
+catch regressions.
+
+The client and the server share the machine (and the GIL), so compare
+numbers between runs on the same host rather than against production.
+
+Run from the backend directory (extra dependencies: benchmarks/requirements.txt):
+    python -m benchmarks.load_bench [--rooms 4] [--clients 10] [--duration 10]
+"""
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+# The benchmark measures the serving path, not the limiters in front of it
+BENCH_ENV = {
+    "OPENAI_API_KEY": "bench",
+    "WS_SOCKET_RATE": "100000",
+    "WS_SOCKET_BURST": "100000",
+    "WS_USER_RATE": "100000",
+    "WS_USER_BURST": "100000",
+    "AI_RATE": "100000",
+    "AI_BURST": "100000",
+    "UPLOAD_RATE": "100000",
+    "UPLOAD_BURST": "100000",
+    "MONGO_MIN_POOL_SIZE": "0"
+}
+
+# name -> relative weight in the HTTP mix
+HTTP_MIX = {
+    "private_history": 30,
+    "private_send": 20,
+    "conversations": 10,
+    "contacts_list": 10,
+    "contacts_search": 10,
+    "media_upload": 5,
+    "auth_login": 3,
+    "ai_chat": 2
+}
+
+# Smallest valid PNG, so uploads look like real images
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "throughput_per_s": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 3),
+            "p95": round(percentile(ordered, 95) * 1000, 3),
+            "p99": round(percentile(ordered, 99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0
+        }
+    }
+
+
+def build_fake_openai(latency: float):
+    """Tiny stand-in for the three OpenAI endpoints the app calls"""
+    from fastapi import FastAPI, Response
+
+    fake = FastAPI()
+
+    @fake.post("/v1/chat/completions")
+    async def chat_completions():
+        await asyncio.sleep(latency)
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "This is a benchmark reply."},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 6, "total_tokens": 16}
+        }
+
+    @fake.post("/v1/audio/speech")
+    async def speech():
+        await asyncio.sleep(latency)
+        return Response(content=b"\xff\xfb" * 512, media_type="audio/mpeg")
+
+    @fake.post("/v1/audio/transcriptions")
+    async def transcriptions():
+        await asyncio.sleep(latency)
+        return {"text": "benchmark transcript"}
+
+    return fake
+
+
+def serve_in_thread(app, port: int):
+    """Run an ASGI app under uvicorn on its own thread and event loop"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError(f"Server on port {port} failed to start")
+        time.sleep(0.01)
+    return server, thread
+
+
+def boot_app(workdir: str, openai_url: str):
+    """Import the app with MongoDB swapped for mongomock-motor; must run before anything imports services"""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["OPENAI_BASE_URL"] = openai_url
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    sys.path.insert(0, BACKEND_DIR)
+    # main.py creates ./uploads at import time
+    os.chdir(workdir)
+
+    from mongomock_motor import AsyncMongoMockClient
+    import database
+
+    mock_db = AsyncMongoMockClient()[database.DATABASE_NAME]
+    for name in dir(database):
+        if name.endswith("_collection"):
+            setattr(database, name, mock_db[name[:-len("_collection")]])
+    database.db = mock_db
+
+    async def noop():
+        pass
+
+    database.connect_database = noop
+    database.close_database = noop
+    # mongomock's with_options returns a synchronous collection
+    database.with_history_reads = lambda collection: collection
+
+    import main
+    return main.app
+
+
+class HttpLoad:
+    def __init__(self, client, users: List[dict], duration: float, concurrency: int, seed: int):
+        self.client = client
+        self.users = users
+        self.duration = duration
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = {name: [] for name in HTTP_MIX}
+        self.errors: Dict[str, int] = {name: 0 for name in HTTP_MIX}
+
+    def _pair(self):
+        user = self.random.choice(self.users)
+        contact = self.users[(self.users.index(user) + 1) % len(self.users)]
+        return user, contact
+
+    async def _request(self, name: str):
+        user, contact = self._pair()
+        if name == "private_history":
+            return await self.client.get(f"/private/messages/{user['user_id']}/{contact['user_id']}")
+        if name == "private_send":
+            return await self.client.post("/private/send", json={
+                "sender_id": user["user_id"],
+                "receiver_id": contact["user_id"],
+                "text": "benchmark message"
+            })
+        if name == "conversations":
+            return await self.client.get(f"/private/conversations/{user['user_id']}")
+        if name == "contacts_list":
+            return await self.client.get(f"/contacts/list/{user['user_id']}")
+        if name == "contacts_search":
+            return await self.client.get("/contacts/search", params={"query": "bench"})
+        if name == "media_upload":
+            return await self.client.post(
+                "/media/upload",
+                params={"user_id": user["user_id"]},
+                files={"file": ("bench.png", PNG_BYTES, "image/png")}
+            )
+        if name == "auth_login":
+            return await self.client.post("/auth/login", json={"email": user["email"], "password": user["password"]})
+        if name == "ai_chat":
+            return await self.client.post("/ai/chat", json={"user_id": user["user_id"], "message": "hello"})
+        raise ValueError(name)
+
+    async def _worker(self, deadline: float):
+        names = list(HTTP_MIX)
+        weights = list(HTTP_MIX.values())
+        while time.perf_counter() < deadline:
+            name = self.random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await self._request(name)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            if failed:
+                self.errors[name] += 1
+            else:
+                self.latencies[name].append(time.perf_counter() - start)
+
+    async def run(self) -> dict:
+        start = time.perf_counter()
+        await asyncio.gather(*(self._worker(start + self.duration) for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - start
+        endpoints = {
+            name: summarize(self.latencies[name], self.errors[name], elapsed) for name in HTTP_MIX
+        }
+        every = [latency for latencies in self.latencies.values() for latency in latencies]
+        return {
+            "concurrency": self.concurrency,
+            "duration_s": round(elapsed, 3),
+            "total": summarize(every, sum(self.errors.values()), elapsed),
+            "endpoints": endpoints
+        }
+
+
+class WebSocketLoad:
+    def __init__(self, base_url: str, rooms: int, clients: int, messages: int, interval: float, timeout: float):
+        self.base_url = base_url
+        self.rooms = rooms
+        self.clients = clients
+        self.messages = messages
+        self.interval = interval
+        self.timeout = timeout
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.sent = 0
+        self._arrived = 0
+        self._all_connected = asyncio.Event()
+
+    def _arrive(self):
+        self._arrived += 1
+        if self._arrived == self.rooms * self.clients:
+            self._all_connected.set()
+
+    async def _client(self, room: int, index: int):
+        import websockets
+
+        url = f"{self.base_url}/ws/bench-room-{room}?user_id=bench-{room}-{index}"
+        expected = self.clients * self.messages
+        received = 0
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                self._arrive()
+                try:
+                    await asyncio.wait_for(self._all_connected.wait(), 10)
+                except asyncio.TimeoutError:
+                    pass
+                # Start the clock only once every socket is in its room
+                deadline = time.perf_counter() + self.timeout
+
+                async def send():
+                    for _ in range(self.messages):
+                        await ws.send(json.dumps({
+                            "sender": f"bench-{room}-{index}",
+                            "sender_id": f"bench-{room}-{index}",
+                            "text": f"bench:{time.perf_counter()}"
+                        }))
+                        self.sent += 1
+                        await asyncio.sleep(self.interval)
+
+                sender = asyncio.create_task(send())
+                try:
+                    while received < expected:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        frame = json.loads(await asyncio.wait_for(ws.recv(), remaining))
+                        if frame.get("type") == "error":
+                            self.errors += 1
+                        elif str(frame.get("text", "")).startswith("bench:"):
+                            self.latencies.append(time.perf_counter() - float(frame["text"][6:]))
+                            received += 1
+                finally:
+                    sender.cancel()
+        except Exception:
+            if not self._all_connected.is_set():
+                self._arrive()
+            self.errors += 1
+        return received
+
+    async def run(self) -> dict:
+        start = time.perf_counter()
+        delivered = await asyncio.gather(*(
+            self._client(room, index)
+            for room in range(self.rooms)
+            for index in range(self.clients)
+        ))
+        elapsed = time.perf_counter() - start
+        summary = summarize(self.latencies, self.errors, elapsed)
+        expected = self.rooms * self.clients * self.clients * self.messages
+        return {
+            "rooms": self.rooms,
+            "clients_per_room": self.clients,
+            "messages_sent": self.sent,
+            "frames_expected": expected,
+            "frames_delivered": sum(delivered),
+            "delivery_ratio": round(sum(delivered) / expected, 4) if expected else 1.0,
+            "duration_s": round(elapsed, 3),
+            **summary
+        }
+
+
+async def seed(client, users: int, messages: int) -> List[dict]:
+    """Register users, pair them up as contacts and give each pair some history"""
+    accounts = []
+    for i in range(users):
+        account = {"username": f"bench{i}", "email": f"bench{i}@example.com", "password": "bench-password"}
+        response = await client.post("/auth/register", json=account)
+        response.raise_for_status()
+        accounts.append({**account, "user_id": response.json()["user_id"]})
+
+    for i, account in enumerate(accounts):
+        contact = accounts[(i + 1) % len(accounts)]
+        await client.post("/contacts/add", json={"user_id": account["user_id"], "contact_user_id": contact["user_id"]})
+        for n in range(messages):
+            await client.post("/private/send", json={
+                "sender_id": account["user_id"],
+                "receiver_id": contact["user_id"],
+                "text": f"seed message {n}"
+            })
+    return accounts
+
+
+def check_thresholds(results: dict, thresholds: dict) -> List[dict]:
+    """
+    Compare results against limits
+
+    Args:
+        results: Benchmark report
+        thresholds: Dotted metric path -> {"max": x} and/or {"min": y}
+
+    Returns:
+        One entry per limit, with the measured value and whether it held
+    """
+    checks = []
+    for path, limits in thresholds.items():
+        value = results
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        for kind, limit in limits.items():
+            ok = value is not None and (value <= limit if kind == "max" else value >= limit)
+            checks.append({"metric": path, kind: limit, "value": value, "ok": ok})
+    return checks
+
+
+async def run(args, app_url: str) -> dict:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=f"http://{app_url}", timeout=30) as client:
+        users = await seed(client, args.users, args.seed_messages)
+        http_load = HttpLoad(client, users, args.duration, args.concurrency, args.seed)
+        ws_load = WebSocketLoad(
+            f"ws://{app_url}",
+            args.rooms,
+            args.clients,
+            args.messages,
+            args.interval,
+            args.duration + 30
+        )
+        http_results, ws_results = await asyncio.gather(http_load.run(), ws_load.run())
+    return {"http": http_results, "websocket": ws_results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=10, help="WebSocket clients per room")
+    parser.add_argument("--messages", type=int, default=20, help="messages sent by each WebSocket client")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between a client's messages")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of HTTP traffic")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent HTTP workers")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed-messages", type=int, default=20, help="private messages seeded per user pair")
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="JSON limits file; empty to skip checks")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nexchat-bench-")
+    try:
+        openai_port, app_port = free_port(), free_port()
+        fake, _ = serve_in_thread(build_fake_openai(args.openai_latency_ms / 1000), openai_port)
+        app = boot_app(workdir, f"http://127.0.0.1:{openai_port}/v1")
+        server, _ = serve_in_thread(app, app_port)
+        try:
+            results = asyncio.run(run(args, f"127.0.0.1:{app_port}"))
+        finally:
+            server.should_exit = fake.should_exit = True
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results["config"] = {
+        key: value for key, value in vars(args).items() if key not in ("thresholds", "output")
+    }
+    thresholds: Optional[dict] = None
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+        results["checks"] = check_thresholds(results, thresholds)
+        results["passed"] = all(check["ok"] for check in results["checks"])
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+    if thresholds is not None and not results["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
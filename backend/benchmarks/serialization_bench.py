@@ -0,0 +1,88 @@
+"""
+Serialization micro-benchmark for message list endpoints
+
+Compares the old read path (full document -> dict rebuilt with msg.get ->
+jsonable_encoder -> json.dumps, as JSONResponse does) against the new one
+(projected document -> slots record -> FastJSONResponse rendering).
+
+Run from the backend directory:
+    python -m benchmarks.serialization_bench [--count 1000] [--repeat 200]
+"""
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from models.records import PrivateMessageRecord
+from services.serialization import dumps, orjson
+import argparse
+import json
+import timeit
+
+
+def make_docs(count: int) -> list:
+    start = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "sender_id": "64b7f0c2a1b2c3d4e5f60718",
+            "receiver_id": "64b7f0c2a1b2c3d4e5f60719",
+            "text": f"message number {i} with a bit of text in it",
+            "message_type": "text",
+            "media_url": None,
+            "timestamp": start + timedelta(seconds=i),
+            "status": "read" if i % 3 else "sent"
+        }
+        for i in range(count)
+    ]
+
+
+def old_path(docs: list) -> bytes:
+    messages = []
+    for msg in docs:
+        messages.append({
+            "id": str(msg["_id"]),
+            "sender_id": msg["sender_id"],
+            "receiver_id": msg["receiver_id"],
+            "text": msg["text"],
+            "message_type": msg.get("message_type", "text"),
+            "media_url": msg.get("media_url"),
+            "timestamp": msg["timestamp"],
+            "status": msg.get("status", "sent")
+        })
+    return json.dumps(
+        jsonable_encoder(messages),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def new_path(docs: list) -> bytes:
+    return dumps([PrivateMessageRecord.from_doc(msg) for msg in docs])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    docs = make_docs(args.count)
+    assert json.loads(old_path(docs)) == json.loads(new_path(docs))
+
+    results = {}
+    for name, fn in (("old", old_path), ("new", new_path)):
+        best = min(timeit.repeat(lambda: fn(docs), number=args.repeat, repeat=5)) / args.repeat
+        results[name] = best * 1000
+
+    print(json.dumps({
+        "messages": args.count,
+        "encoder": "orjson" if orjson is not None else "json",
+        "old_ms": round(results["old"], 3),
+        "new_ms": round(results["new"], 3),
+        "speedup": round(results["old"] / results["new"], 2)
+    }))
+
+
+if __name__ == "__main__":
+    main()
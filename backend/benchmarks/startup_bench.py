@@ -0,0 +1,95 @@
+"""
+Worker boot-time benchmark
+
+Times `import main` in fresh interpreters for each feature-flag combination.
+That import is what every uvicorn worker (and every test session) pays
+before it can serve. Optionally lists the slowest imports, taken from
+`python -X importtime`.
+
+Run from the backend directory:
+    python -m benchmarks.startup_bench [--repeat 5] [--top 10] [--max-ms 1000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "all_features": {"ENABLE_AI": "true", "ENABLE_MEDIA": "true"},
+    "no_ai": {"ENABLE_AI": "false", "ENABLE_MEDIA": "true"},
+    "core_only": {"ENABLE_AI": "false", "ENABLE_MEDIA": "false"}
+}
+
+PROBE = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def run_probe(env: dict) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1]) * 1000
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    """main's direct imports ranked by cumulative time, from -X importtime"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown as two spaces per level after the separator's own space
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append((int(cumulative), name.strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(rows, reverse=True)[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="list the N slowest imports for all_features (0 to skip)")
+    parser.add_argument("--max-ms", type=float, help="exit 1 if all_features median import exceeds this")
+    args = parser.parse_args()
+
+    # Imports must not need secrets or a reachable server
+    base_env = {"OPENAI_API_KEY": "", "PYTHONDONTWRITEBYTECODE": "1"}
+    # Warm the OS file cache so the first scenario is not penalised
+    run_probe({**base_env, **SCENARIOS["all_features"]})
+
+    results = {}
+    for name, flags in SCENARIOS.items():
+        timings = [run_probe({**base_env, **flags}) for _ in range(args.repeat)]
+        results[name] = {
+            "median_ms": round(statistics.median(timings), 1),
+            "min_ms": round(min(timings), 1),
+            "max_ms": round(max(timings), 1)
+        }
+
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "import_main": results}
+    if args.top:
+        report["slowest_imports"] = slowest_imports({**base_env, **SCENARIOS["all_features"]}, args.top)
+    print(json.dumps(report, indent=2))
+
+    if args.max_ms is not None and results["all_features"]["median_ms"] > args.max_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,4 +7,51 @@ MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "nexchat")
 SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+
+# MongoDB connection pool tuning
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 20000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"
+MONGO_HISTORY_READ_PREFERENCE = os.getenv("MONGO_HISTORY_READ_PREFERENCE", "secondaryPreferred")
+MONGO_SHUTDOWN_DRAIN_SECONDS = float(os.getenv("MONGO_SHUTDOWN_DRAIN_SECONDS", 5))
+
+
+# Realtime admission control and rate limits (rates are per second)
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", 16384))
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", 10000))
+WS_MAX_CONNECTIONS_PER_ROOM = int(os.getenv("WS_MAX_CONNECTIONS_PER_ROOM", 1000))
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 10))
+WS_SOCKET_RATE = float(os.getenv("WS_SOCKET_RATE", 5))
+WS_SOCKET_BURST = int(os.getenv("WS_SOCKET_BURST", 20))
+WS_USER_RATE = float(os.getenv("WS_USER_RATE", 10))
+WS_USER_BURST = int(os.getenv("WS_USER_BURST", 40))
+AI_RATE = float(os.getenv("AI_RATE", 0.5))
+AI_BURST = int(os.getenv("AI_BURST", 5))
+UPLOAD_RATE = float(os.getenv("UPLOAD_RATE", 0.5))
+UPLOAD_BURST = int(os.getenv("UPLOAD_BURST", 10))
+# Half-open sockets are found with protocol-level ping/pong, which browsers answer on their own.
+# Applies when started via `python main.py` (with the uvicorn CLI use --ws-ping-interval / --ws-ping-timeout)
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 20))
+WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", 20))
+# Close sockets that have sent nothing for this many seconds (0 keeps idle clients connected),
+# and the resolution of the timer wheel that enforces it
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 0))
+WS_IDLE_TICK = float(os.getenv("WS_IDLE_TICK", 1))
+
+# Optional features; routers for disabled features are never imported
+ENABLE_AI = os.getenv("ENABLE_AI", "true").lower() in ("1", "true", "yes")
+ENABLE_MEDIA = os.getenv("ENABLE_MEDIA", "true").lower() in ("1", "true", "yes")
+
+# Response compression: bodies smaller than this go out as-is
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+# permessage-deflate on WebSockets; applies when started via `python main.py`
+# (with the uvicorn CLI use --ws-per-message-deflate / UVICORN_WS_PER_MESSAGE_DEFLATE)
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() in ("1", "true", "yes")
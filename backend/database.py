@@ -1,15 +1,175 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from config import MONGODB_URL, DATABASE_NAME
+from pymongo import ReadPreference, monitoring
+from config import (
+    MONGODB_URL,
+    DATABASE_NAME,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGO_COMPRESSORS,
+    MONGO_HISTORY_READ_PREFERENCE,
+    MONGO_SHUTDOWN_DRAIN_SECONDS
+)
+from services.metrics import command_metrics
+import asyncio
+import threading
+import time
 
-client = AsyncIOMotorClient(MONGODB_URL)
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST
+}
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters; events arrive from driver threads, hence the lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkouts = 0
+        self._started = threading.local()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "utilization": self.checked_out / MONGO_MAX_POOL_SIZE if MONGO_MAX_POOL_SIZE else 0.0,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_wait_avg_ms": (self.checkout_wait_total / self.checkouts * 1000) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": self.checkout_wait_max * 1000
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        self._started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        waited = time.perf_counter() - getattr(self._started, "value", time.perf_counter())
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.checkout_wait_total += waited
+            self.checkout_wait_max = max(self.checkout_wait_max, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+
+pool_metrics = PoolMetrics()
+
+client_options = dict(
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=[pool_metrics, command_metrics]
+)
+if MONGO_COMPRESSORS:
+    client_options["compressors"] = MONGO_COMPRESSORS
+
+# connect=False: no monitor threads or sockets until connect_database() runs in the lifespan
+client = AsyncIOMotorClient(MONGODB_URL, connect=False, **client_options)
 db = client[DATABASE_NAME]
 
 users_collection = db["users"]
 messages_collection = db["messages"]
 conversations_collection = db["conversations"]
 conversation_messages_collection = db["conversation_messages"]
+conversation_members_collection = db["conversation_members"]
 contacts_collection = db["contacts"]
 contact_requests_collection = db["contact_requests"]
 media_collection = db["media"]
 ai_conversations_collection = db["ai_conversations"]
-ai_messages_collection = db["ai_messages"]
\ No newline at end of file
+ai_messages_collection = db["ai_messages"]
+private_messages_collection = db["private_messages"]
+# ETag counters for list endpoints, see services/resource_versions.py
+resource_versions_collection = db["resource_versions"]
+# Cold tiers written by services/archive_service.py
+messages_archive_collection = db["messages_archive"]
+private_messages_archive_collection = db["private_messages_archive"]
+ai_messages_archive_collection = db["ai_messages_archive"]
+# Voice-to-text job status, shared by every worker, see services/transcription_service.py
+transcription_jobs_collection = db["transcription_jobs"]
+
+# History reads tolerate slight replica lag, so they may go to secondaries
+history_read_preference = READ_PREFERENCES.get(MONGO_HISTORY_READ_PREFERENCE, ReadPreference.PRIMARY)
+
+
+def with_history_reads(collection):
+    return collection.with_options(read_preference=history_read_preference)
+
+
+async def ensure_indexes():
+    # Room replay and history page by _id within a room
+    await messages_collection.create_index([("room", 1), ("_id", 1)])
+    # Group membership is looked up from both sides: a group's members and a user's groups
+    await conversation_members_collection.create_index([("conversation_id", 1), ("user_id", 1)], unique=True)
+    await conversation_members_collection.create_index([("user_id", 1), ("conversation_id", 1)])
+    # Group history pages and unread counts scan _id within one conversation
+    await conversation_messages_collection.create_index([("conversation_id", 1), ("_id", 1)])
+    # Archive segments are read per group in document order
+    for archive in (messages_archive_collection, private_messages_archive_collection, ai_messages_archive_collection):
+        await archive.create_index([("group", 1), ("first_id", 1)])
+    # Transcription jobs expire on their own once expires_at passes
+    await transcription_jobs_collection.create_index("expires_at", expireAfterSeconds=0)
+
+
+async def connect_database():
+    """Verify the server is reachable, create indexes and open minPoolSize connections up front"""
+    await client.admin.command("ping")
+    await ensure_indexes()
+    # Concurrent pings force the pool to open that many sockets now rather than on first traffic
+    await asyncio.gather(*[client.admin.command("ping") for _ in range(MONGO_MIN_POOL_SIZE)])
+
+
+async def close_database():
+    """Wait for in-flight operations to return their connections, then close the pool"""
+    deadline = time.monotonic() + MONGO_SHUTDOWN_DRAIN_SECONDS
+    while pool_metrics.checked_out > 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    client.close()
@@ -1,15 +1,46 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from routes import auth, chat, contacts, private_chat, ai, media
+from routes import auth, chat, contacts, private_chat, groups, admin
 from websocket_manager import manager
-from database import messages_collection
-from datetime import datetime
+from services.message_service import room_message_repository
+from services.receipt_service import receipt_service
+from services.archive_service import archive_service
+from services.room_history import room_history
+from services.rate_limiter import TokenBucket, ws_user_limiter, client_key
+from services.transcription_service import transcription_service
+from services.metrics import registry, rate_limited, loop_lag_monitor, MetricsMiddleware
+from services.profiling import ProfilingMiddleware
+from services.compression import CompressionMiddleware
+from services.openai_service import openai_service
+from services.storage_service import storage_service
+from config import WS_MAX_FRAME_BYTES, WS_SOCKET_RATE, WS_SOCKET_BURST, ENABLE_AI, ENABLE_MEDIA, WS_PER_MESSAGE_DEFLATE, WS_PING_INTERVAL, WS_PING_TIMEOUT
+from typing import Optional
+from database import connect_database, close_database, pool_metrics
+from contextlib import asynccontextmanager
 import json
 import os
 
-app = FastAPI(title="Nexchat API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # TTS output and uploads are written here, possibly before the first upload creates it
+    os.makedirs(storage_service.upload_dir, exist_ok=True)
+    await connect_database()
+    receipt_service.start()
+    archive_service.start()
+    manager.start_reaper()
+    loop_lag_monitor.start()
+    yield
+    await loop_lag_monitor.stop()
+    await manager.stop_reaper()
+    await archive_service.stop()
+    await receipt_service.stop()
+    openai_service.close()
+    storage_service.close()
+    await close_database()
+
+app = FastAPI(title="Nexchat API", lifespan=lifespan)
 
 # Create uploads directory
 os.makedirs("uploads", exist_ok=True)
@@ -31,6 +62,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.options("/{rest_of_path:path}")
 async def preflight_handler(request: Request, rest_of_path: str):
@@ -48,40 +82,191 @@ app.include_router(auth.router)
 app.include_router(chat.router)
 app.include_router(contacts.router)
 app.include_router(private_chat.router)
-app.include_router(ai.router)
-app.include_router(media.router)
+app.include_router(groups.router)
+app.include_router(admin.router)
+
+# Imported only when enabled: the AI router pulls in the OpenAI SDK
+if ENABLE_AI:
+    from routes import ai
+    app.include_router(ai.router)
+if ENABLE_MEDIA:
+    from routes import media
+    app.include_router(media.router)
 
 @app.get("/")
 async def root():
     return {"message": "Nexchat API with AI Assistant is running"}
 
+@app.get("/health/db")
+async def database_health():
+    return pool_metrics.snapshot()
+
+# Gauges are read at scrape time, so they cost nothing between scrapes
+registry.gauge(
+    "nexchat_ws_connections", "Open WebSocket connections", ("kind",),
+    callback=lambda: {
+        ("room",): sum(len(sockets) for sockets in manager.active_connections.values()),
+        ("user",): sum(len(sockets) for sockets in manager.user_connections.values())
+    }
+)
+registry.gauge(
+    "nexchat_ws_active_rooms", "Rooms with at least one open socket",
+    callback=lambda: {(): len(manager.active_connections)}
+)
+registry.gauge(
+    "nexchat_mongo_pool", "MongoDB connection pool state", ("state",),
+    callback=lambda: {(key,): value for key, value in pool_metrics.snapshot().items()}
+)
+registry.gauge(
+    "nexchat_queue_depth", "Work waiting in in-process queues", ("queue",),
+    callback=lambda: {
+        ("receipts",): receipt_service.pending(),
+        ("transcriptions",): transcription_service.pending(),
+        ("ws_held",): sum(len(queue) for queue in manager.held.values())
+    }
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+async def send_error(websocket: WebSocket, code: str, retry_after: Optional[float] = None):
+    """Tell the client its frame was dropped rather than queueing it"""
+    error = {"type": "error", "code": code}
+    if retry_after is not None:
+        error["retry_after"] = round(retry_after, 2)
+    await websocket.send_text(json.dumps(error))
+
+async def admit_frame(websocket: WebSocket, data: str, socket_bucket: TokenBucket) -> Optional[dict]:
+    """Apply frame size and per-socket limits, then parse; returns None if the frame was rejected or consumed"""
+    manager.touch(websocket)
+    if len(data) > WS_MAX_FRAME_BYTES:
+        await send_error(websocket, "frame_too_large")
+        return None
+    if not socket_bucket.take():
+        rate_limited.inc("ws_socket")
+        await send_error(websocket, "rate_limited", socket_bucket.retry_after())
+        return None
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        await send_error(websocket, "invalid_json")
+        return None
+    if not isinstance(frame, dict):
+        await send_error(websocket, "invalid_frame")
+        return None
+    return frame
+
+async def admit_user(websocket: WebSocket, user_id: str) -> bool:
+    """Apply the per-user budget shared by all of a user's sockets"""
+    retry_after = ws_user_limiter.take(f"ws:{user_id}")
+    if retry_after is not None:
+        rate_limited.inc("ws_user")
+        await send_error(websocket, "rate_limited", retry_after)
+        return False
+    return True
+
 @app.websocket("/ws/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str):
-    await manager.connect(websocket, room_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    room_id: str,
+    last_id: Optional[str] = None,
+    user_id: Optional[str] = None
+):
+    # Live broadcasts are held back until the missed messages have been replayed
+    if not await manager.connect(websocket, room_id, hold=last_id is not None):
+        return
+    socket_bucket = TokenBucket(WS_SOCKET_RATE, WS_SOCKET_BURST)
+    try:
+        if last_id is not None:
+            replayed_id = await room_history.replay(websocket, room_id, last_id)
+            await manager.release(websocket, replayed_id)
+
+        while True:
+            data = await websocket.receive_text()
+            message_data = await admit_frame(websocket, data, socket_bucket)
+            if message_data is None:
+                continue
+            # Anonymous frames are budgeted per address rather than all sharing one bucket
+            identity = user_id or message_data.get("sender_id") or f"ip:{client_key(websocket)}"
+            if not await admit_user(websocket, str(identity)):
+                continue
+
+            # Read/delivery receipts are coalesced and written on the next flush
+            if message_data.get("type") == "receipt":
+                try:
+                    receipt_service.queue(
+                        message_data["user_id"],
+                        message_data["contact_id"],
+                        message_data["message_id"],
+                        message_data.get("status", "read")
+                    )
+                except (KeyError, ValueError):
+                    pass
+                continue
+
+            try:
+                sender, sender_id, text = message_data["sender"], message_data["sender_id"], message_data["text"]
+            except KeyError:
+                await send_error(websocket, "invalid_frame")
+                continue
+
+            broadcast_msg = await room_message_repository.insert(room_id, sender, sender_id, text)
+
+            frame = json.dumps(broadcast_msg)
+            room_history.append(room_id, broadcast_msg["id"], frame)
+            await manager.broadcast(frame, room_id, broadcast_msg["id"])
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket, room_id)
+
+@app.websocket("/ws/user/{user_id}")
+async def user_websocket_endpoint(websocket: WebSocket, user_id: str):
+    """Private channel: receives pushed messages/status changes, sends typing and receipts"""
+    if not await manager.connect_user(websocket, user_id):
+        return
+    socket_bucket = TokenBucket(WS_SOCKET_RATE, WS_SOCKET_BURST)
     try:
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
-
-            new_message = {
-                "room": room_id,
-                "sender": message_data["sender"],
-                "sender_id": message_data["sender_id"],
-                "text": message_data["text"],
-                "timestamp": datetime.utcnow()
-            }
-            result = await messages_collection.insert_one(new_message)
-
-            broadcast_msg = {
-                "id": str(result.inserted_id),
-                "room": room_id,
-                "sender": message_data["sender"],
-                "sender_id": message_data["sender_id"],
-                "text": message_data["text"],
-                "timestamp": datetime.utcnow().isoformat()
-            }
-
-            await manager.broadcast(json.dumps(broadcast_msg), room_id)
+            event = await admit_frame(websocket, data, socket_bucket)
+            if event is None or not await admit_user(websocket, user_id):
+                continue
+            event_type = event.get("type")
+
+            if event_type == "typing" and event.get("contact_id"):
+                await manager.notify_users({
+                    "type": "typing",
+                    "user_id": user_id,
+                    "is_typing": bool(event.get("is_typing", True))
+                }, event["contact_id"])
+
+            elif event_type == "receipt":
+                try:
+                    receipt_service.queue(
+                        user_id,
+                        event["contact_id"],
+                        event["message_id"],
+                        event.get("status", "read")
+                    )
+                except (KeyError, ValueError):
+                    pass
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, room_id)
\ No newline at end of file
+        pass
+    finally:
+        manager.disconnect_user(websocket, user_id)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", 8000)),
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
+        ws_ping_interval=WS_PING_INTERVAL,
+        ws_ping_timeout=WS_PING_TIMEOUT
+    )
@@ -24,4 +24,31 @@ class ConversationResponse(BaseModel):
     contact_username: str
     last_message: Optional[str] = None
     last_message_time: Optional[datetime] = None
-    unread_count: int = 0
\ No newline at end of file
+    unread_count: int = 0
+
+class MessageStatusBatch(BaseModel):
+    user_id: str
+    message_ids: List[str]
+    status: str = "read"
+
+class ConversationStatusUpdate(BaseModel):
+    up_to_id: Optional[str] = None
+    status: str = "read"
+
+class GroupCreate(BaseModel):
+    name: str
+    creator_id: str
+    member_ids: List[str] = []
+
+class GroupMembersUpdate(BaseModel):
+    user_ids: List[str]
+
+class GroupMessage(BaseModel):
+    sender_id: str
+    text: str
+    message_type: str = "text"
+    media_url: Optional[str] = None
+
+class GroupReadUpdate(BaseModel):
+    user_id: str
+    up_to_id: str
\ No newline at end of file
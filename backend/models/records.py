@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from typing import Optional
+from datetime import datetime
+
+# Lightweight read-side records decoded straight from projected Mongo documents.
+# Field order is the JSON key order, so keep it in line with the API responses.
+
+@dataclass(slots=True)
+class PrivateMessageRecord:
+    id: str
+    sender_id: str
+    receiver_id: str
+    text: str
+    message_type: str
+    media_url: Optional[str]
+    timestamp: datetime
+    status: str
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "PrivateMessageRecord":
+        return cls(
+            str(doc["_id"]),
+            doc["sender_id"],
+            doc["receiver_id"],
+            doc["text"],
+            doc.get("message_type", "text"),
+            doc.get("media_url"),
+            doc["timestamp"],
+            doc.get("status", "sent")
+        )
+
+@dataclass(slots=True)
+class RoomMessageRecord:
+    id: str
+    room: str
+    sender: str
+    sender_id: str
+    text: str
+    timestamp: datetime
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "RoomMessageRecord":
+        return cls(
+            str(doc["_id"]),
+            doc["room"],
+            doc["sender"],
+            doc["sender_id"],
+            doc["text"],
+            doc["timestamp"]
+        )
+
+@dataclass(slots=True)
+class AIMessageRecord:
+    id: str
+    role: str
+    content: str
+    timestamp: datetime
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "AIMessageRecord":
+        return cls(str(doc["_id"]), doc["role"], doc["content"], doc["timestamp"])
+
+@dataclass(slots=True)
+class ContactRecord:
+    id: str
+    contact_user_id: str
+    contact_username: str
+    contact_email: str
+    added_at: datetime
+    is_online: bool
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "ContactRecord":
+        return cls(
+            str(doc["_id"]),
+            doc["contact_user_id"],
+            doc["contact_username"],
+            doc["contact_email"],
+            doc["added_at"],
+            doc.get("is_online", False)
+        )
+
+@dataclass(slots=True)
+class UserSearchRecord:
+    id: str
+    username: str
+    email: str
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "UserSearchRecord":
+        return cls(str(doc["_id"]), doc["username"], doc["email"])
+
+@dataclass(slots=True)
+class GroupMessageRecord:
+    id: str
+    conversation_id: str
+    sender_id: str
+    text: str
+    message_type: str
+    media_url: Optional[str]
+    timestamp: datetime
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "GroupMessageRecord":
+        return cls(
+            str(doc["_id"]),
+            doc["conversation_id"],
+            doc["sender_id"],
+            doc["text"],
+            doc.get("message_type", "text"),
+            doc.get("media_url"),
+            doc["timestamp"]
+        )
\ No newline at end of file
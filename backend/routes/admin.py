@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from services.profiling import profiler
+from services.archive_service import archive_service
+from services.serialization import FastJSONResponse
+
+class ProfilingSettings(BaseModel):
+    routes: Optional[List[str]] = None
+    sample_rate: Optional[float] = None
+
+def require_token(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints are off unless PROFILE_TOKEN is set, and then need it in X-Admin-Token"""
+    if not profiler.check_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_token)])
+
+@router.get("/profiling")
+async def get_profiling_settings():
+    return profiler.settings()
+
+@router.put("/profiling")
+async def update_profiling_settings(settings: ProfilingSettings):
+    """Change sampled routes/rate on this worker without a redeploy"""
+    profiler.configure(settings.routes, settings.sample_rate)
+    return profiler.settings()
+
+@router.get("/profiles")
+async def list_profiles():
+    """Most recent first"""
+    return FastJSONResponse(profiler.list())
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    trace = profiler.get(profile_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FastJSONResponse(trace.to_dict())
+
+@router.get("/profiles/{profile_id}/folded")
+async def download_folded_stacks(profile_id: str):
+    """Collapsed stacks of the sampled event loop thread, ready for a flame graph"""
+    trace = profiler.get(profile_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        trace.folded_text(),
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+    )
+
+@router.post("/archive/run")
+async def run_archive():
+    """Run one archival and upload-TTL pass now; like all of /admin, only available when PROFILE_TOKEN is set"""
+    return await archive_service.run_once()
\ No newline at end of file
@@ -1,61 +1,65 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from openai import OpenAI
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
 import os
 from config import SECRET_KEY
-from database import db
 from models.ai_message import AIMessageRequest, AIMessageResponse
+from services.message_service import ai_message_repository
+from services.rate_limiter import ai_limiter
+from services.transcription_service import transcription_service
+from services.metrics import openai_duration
+from services.openai_service import get_openai_client
+from services.resource_versions import resource_versions, ai_history
+from fastapi.responses import JSONResponse
 from datetime import datetime
-from bson import ObjectId
-import aiofiles
+import asyncio
 
 router = APIRouter(prefix="/ai", tags=["ai"])
-ai_messages_collection = db["ai_messages"]
+rate_limit = Depends(ai_limiter.dependency("ai"))
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-@router.post("/voice-to-text")
-async def voice_to_text(audio: UploadFile = File(...), user_id: str = ""):
-    """Convert voice to text using OpenAI Whisper"""
+@router.post("/voice-to-text", dependencies=[rate_limit])
+async def voice_to_text(
+    audio: UploadFile = File(...),
+    user_id: str = "",
+    wait: bool = True,
+    client=Depends(get_openai_client)
+):
+    """Convert voice to text using OpenAI Whisper; long clips return a job to poll"""
     try:
-        # Save audio temporarily
-        temp_path = f"temp_{user_id}_{audio.filename}"
-        
-        async with aiofiles.open(temp_path, 'wb') as f:
-            content = await audio.read()
-            await f.write(content)
-        
-        # Transcribe using Whisper
-        with open(temp_path, 'rb') as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en"
-            )
-        
-        # Clean up temp file
-        os.remove(temp_path)
-        
-        return {"text": transcript.text}
+        buffer = await transcription_service.buffer_upload(audio)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+    try:
+        job = await transcription_service.submit(client, buffer, audio.filename or "audio.webm", user_id)
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    if wait:
+        try:
+            await asyncio.wait_for(job.done.wait(), transcription_service.sync_wait)
+        except asyncio.TimeoutError:
+            pass
+    
+    if job.status == "done":
+        return {"text": job.text}
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {job.error}")
+    
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+@router.get("/voice-to-text/{job_id}")
+async def get_transcription(job_id: str):
+    """Get the status (and text, once done) of a transcription job"""
+    job = await transcription_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-@router.post("/chat")
-async def ai_chat(request: AIMessageRequest):
+@router.post("/chat", dependencies=[rate_limit])
+async def ai_chat(request: AIMessageRequest, client=Depends(get_openai_client)):
     """Get AI response using ChatGPT"""
     try:
         # Get conversation history (last 10 messages)
-        history = []
-        cursor = ai_messages_collection.find(
-            {"user_id": request.user_id}
-        ).sort("timestamp", -1).limit(10)
-        
-        async for msg in cursor:
-            history.insert(0, {
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        history = await ai_message_repository.recent_context(request.user_id, 10)
         
         # Add current user message
         history.append({
@@ -64,53 +68,42 @@ async def ai_chat(request: AIMessageRequest):
         })
         
         # Get AI response
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # or gpt-3.5-turbo for cheaper
-            messages=[
-                {"role": "system", "content": "You are a helpful AI assistant integrated into a chat application. Be concise and friendly."},
-                *history
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
+        with openai_duration.time("chat"):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",  # or gpt-3.5-turbo for cheaper
+                messages=[
+                    {"role": "system", "content": "You are a helpful AI assistant integrated into a chat application. Be concise and friendly."},
+                    *history
+                ],
+                max_tokens=500,
+                temperature=0.7
+            )
         
         ai_reply = response.choices[0].message.content
         
-        # Save user message
-        user_msg = {
-            "user_id": request.user_id,
-            "role": "user",
-            "content": request.message,
-            "timestamp": datetime.utcnow()
-        }
-        await ai_messages_collection.insert_one(user_msg)
-        
-        # Save AI response
-        ai_msg = {
-            "user_id": request.user_id,
-            "role": "assistant",
-            "content": ai_reply,
-            "timestamp": datetime.utcnow()
-        }
-        result = await ai_messages_collection.insert_one(ai_msg)
+        # Save user message and AI response
+        await ai_message_repository.insert(request.user_id, "user", request.message)
+        message_id = await ai_message_repository.insert(request.user_id, "assistant", ai_reply)
+        await resource_versions.bump(ai_history(request.user_id))
         
         return AIMessageResponse(
             reply=ai_reply,
-            message_id=str(result.inserted_id)
+            message_id=message_id
         )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI chat failed: {str(e)}")
 
-@router.post("/text-to-speech")
-async def text_to_speech(text: str):
+@router.post("/text-to-speech", dependencies=[rate_limit])
+async def text_to_speech(text: str, client=Depends(get_openai_client)):
     """Convert text to speech using OpenAI TTS"""
     try:
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice="alloy",
-            input=text
-        )
+        with openai_duration.time("speech"):
+            response = client.audio.speech.create(
+                model="tts-1",
+                voice="alloy",
+                input=text
+            )
         
         # Save audio file
         filename = f"tts_{datetime.utcnow().timestamp()}.mp3"
@@ -125,20 +118,10 @@ async def text_to_speech(text: str):
         raise HTTPException(status_code=500, detail=f"TTS failed: {str(e)}")
 
 @router.get("/history/{user_id}")
-async def get_ai_history(user_id: str, limit: int = 50):
-    """Get AI conversation history"""
-    messages = []
-    
-    cursor = ai_messages_collection.find(
-        {"user_id": user_id}
-    ).sort("timestamp", 1).limit(limit)
-    
-    async for msg in cursor:
-        messages.append({
-            "id": str(msg["_id"]),
-            "role": msg["role"],
-            "content": msg["content"],
-            "timestamp": msg["timestamp"]
-        })
-    
-    return messages
\ No newline at end of file
+async def get_ai_history(request: Request, user_id: str, limit: int = 50):
+    """Get AI conversation history; 304 if unchanged since the client's ETag"""
+    return await resource_versions.respond(
+        request,
+        ai_history(user_id),
+        lambda: ai_message_repository.history(user_id, limit)
+    )
\ No newline at end of file
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from database import users_collection, db
 from models.contact import ContactAdd, ContactResponse
+from models.records import ContactRecord, UserSearchRecord
+from services.serialization import FastJSONResponse
+from services.resource_versions import resource_versions, contacts
 from datetime import datetime
 from bson import ObjectId
 from typing import List
@@ -8,23 +11,25 @@ from typing import List
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 contacts_collection = db["contacts"]
 
+SEARCH_PROJECTION = {"username": 1, "email": 1}
+CONTACT_PROJECTION = {
+    "contact_user_id": 1,
+    "contact_username": 1,
+    "contact_email": 1,
+    "added_at": 1,
+    "is_online": 1
+}
+
 @router.get("/search")
 async def search_users(query: str):
-    users = []
     cursor = users_collection.find({
         "$or": [
             {"username": {"$regex": query, "$options": "i"}},
             {"email": {"$regex": query, "$options": "i"}}
         ]
-    }).limit(10)
+    }, SEARCH_PROJECTION).limit(10)
     
-    async for user in cursor:
-        users.append({
-            "id": str(user["_id"]),
-            "username": user["username"],
-            "email": user["email"]
-        })
-    return users
+    return FastJSONResponse([UserSearchRecord.from_doc(user) async for user in cursor])
 
 @router.post("/add")
 async def add_contact(contact: ContactAdd):
@@ -50,28 +55,21 @@ async def add_contact(contact: ContactAdd):
     }
     
     result = await contacts_collection.insert_one(new_contact)
+    await resource_versions.bump(contacts(contact.user_id))
     return {"message": "Contact added", "id": str(result.inserted_id)}
 
 @router.get("/list/{user_id}")
-async def get_contacts(user_id: str):
-    contacts = []
-    cursor = contacts_collection.find({"user_id": user_id})
-    
-    async for contact in cursor:
-        contacts.append({
-            "id": str(contact["_id"]),
-            "contact_user_id": contact["contact_user_id"],
-            "contact_username": contact["contact_username"],
-            "contact_email": contact["contact_email"],
-            "added_at": contact["added_at"],
-            "is_online": contact.get("is_online", False)
-        })
+async def get_contacts(request: Request, user_id: str):
+    async def load():
+        cursor = contacts_collection.find({"user_id": user_id}, CONTACT_PROJECTION)
+        return [ContactRecord.from_doc(contact) async for contact in cursor]
     
-    return contacts
+    return await resource_versions.respond(request, contacts(user_id), load)
 
 @router.delete("/{contact_id}")
 async def delete_contact(contact_id: str):
-    result = await contacts_collection.delete_one({"_id": ObjectId(contact_id)})
-    if result.deleted_count == 0:
+    deleted = await contacts_collection.find_one_and_delete({"_id": ObjectId(contact_id)}, projection={"user_id": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Contact not found")
+    await resource_versions.bump(contacts(deleted["user_id"]))
     return {"message": "Contact deleted"}
\ No newline at end of file
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+from models.conversation import GroupCreate, GroupMembersUpdate, GroupMessage, GroupReadUpdate
+from services.group_service import group_service
+from services.serialization import FastJSONResponse
+
+router = APIRouter(prefix="/groups", tags=["groups"])
+
+async def require_member(group_id: str, user_id: str):
+    if not await group_service.is_member(group_id, user_id):
+        raise HTTPException(status_code=403, detail="Not a member of this group")
+
+@router.post("/create")
+async def create_group(group: GroupCreate):
+    try:
+        return await group_service.create(group.name, group.creator_id, group.member_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/user/{user_id}")
+async def get_user_groups(user_id: str):
+    """A user's groups with last message and unread count"""
+    return FastJSONResponse(await group_service.list_for_user(user_id))
+
+@router.get("/{group_id}")
+async def get_group(group_id: str):
+    group = await group_service.get(group_id)
+    if group is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+
+    return group
+
+@router.get("/{group_id}/members")
+async def get_group_members(group_id: str):
+    return {"group_id": group_id, "members": sorted(await group_service.members(group_id))}
+
+@router.post("/{group_id}/members")
+async def add_group_members(group_id: str, update: GroupMembersUpdate):
+    if await group_service.get(group_id) is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+
+    try:
+        added = await group_service.add_members(group_id, update.user_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"message": "Members added", "added": added}
+
+@router.delete("/{group_id}/members/{user_id}")
+async def remove_group_member(group_id: str, user_id: str):
+    if not await group_service.remove_member(group_id, user_id):
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    return {"message": "Member removed"}
+
+@router.post("/{group_id}/messages")
+async def send_group_message(group_id: str, message: GroupMessage):
+    """Send a message to every member of a group"""
+    await require_member(group_id, message.sender_id)
+    return await group_service.send(
+        group_id,
+        message.sender_id,
+        message.text,
+        message.message_type,
+        message.media_url
+    )
+
+@router.get("/{group_id}/messages")
+async def get_group_messages(group_id: str, user_id: str, limit: int = 50, before_id: Optional[str] = None):
+    """Get the latest group messages, paging back with before_id"""
+    await require_member(group_id, user_id)
+    try:
+        messages = await group_service.history(group_id, limit, before_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return FastJSONResponse(messages)
+
+@router.put("/{group_id}/read")
+async def mark_group_read(group_id: str, update: GroupReadUpdate):
+    """Move the user's read pointer up to a message id"""
+    try:
+        marked = await group_service.mark_read(group_id, update.user_id, update.up_to_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not marked:
+        raise HTTPException(status_code=403, detail="Not a member of this group")
+
+    return {"message": "Read pointer updated"}
\ No newline at end of file
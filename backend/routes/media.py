@@ -1,71 +1,40 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import FileResponse
+from typing import Optional
 import os
-import aiofiles
-from datetime import datetime
-import uuid
+from services.rate_limiter import upload_limiter
+from services.storage_service import storage_service, UploadRejected
 
 router = APIRouter(prefix="/media", tags=["media"])
 
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+@router.post("/upload", dependencies=[Depends(upload_limiter.dependency("upload"))])
+async def upload_media(request: Request, media_type: Optional[str] = None):
+    """
+    Store the multipart "file" field once its content, size and scan checks pass
 
-ALLOWED_EXTENSIONS = {
-    "image": [".jpg", ".jpeg", ".png", ".gif", ".webp"],
-    "audio": [".mp3", ".wav", ".ogg", ".m4a", ".webm"],
-    "video": [".mp4", ".webm", ".mov"],
-    "file": [".pdf", ".doc", ".docx", ".txt", ".zip"]
-}
-
-MAX_FILE_SIZE = 50 * 1024 * 1024
-
-@router.post("/upload")
-async def upload_media(file: UploadFile = File(...), media_type: str = "image"):
+    The body is read here rather than declared as File(...), so the checks
+    run while it arrives instead of after FastAPI has spooled all of it.
+    media_type is checked if given.
+    """
     try:
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        
-        valid_extensions = []
-        for extensions in ALLOWED_EXTENSIONS.values():
-            valid_extensions.extend(extensions)
-        
-        if file_ext not in valid_extensions:
-            raise HTTPException(status_code=400, detail="File type not allowed")
-        
-        unique_filename = f"{uuid.uuid4()}_{datetime.utcnow().timestamp()}{file_ext}"
-        filepath = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        async with aiofiles.open(filepath, 'wb') as f:
-            content = await file.read()
-            
-            if len(content) > MAX_FILE_SIZE:
-                raise HTTPException(status_code=400, detail="File too large (max 50MB)")
-            
-            await f.write(content)
-        
-        return {
-            "filename": unique_filename,
-            "url": f"/media/files/{unique_filename}",
-            "size": len(content),
-            "type": media_type
-        }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+        return await storage_service.store_upload(request.stream(), request.headers.get("content-type", ""), media_type)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 @router.get("/files/{filename}")
 async def get_media(filename: str):
-    filepath = os.path.join(UPLOAD_DIR, filename)
+    filepath = storage_service.published_path(filename)
     
-    if not os.path.exists(filepath):
+    if filepath is None or not os.path.isfile(filepath):
         raise HTTPException(status_code=404, detail="File not found")
     
     return FileResponse(filepath)
 
 @router.delete("/files/{filename}")
 async def delete_media(filename: str):
-    filepath = os.path.join(UPLOAD_DIR, filename)
+    filepath = storage_service.published_path(filename)
     
-    if not os.path.exists(filepath):
+    if filepath is None or not os.path.isfile(filepath):
         raise HTTPException(status_code=404, detail="File not found")
     
     os.remove(filepath)
@@ -1,128 +1,76 @@
-from fastapi import APIRouter, HTTPException
-from database import db
-from models.conversation import PrivateMessage, PrivateMessageResponse
-from datetime import datetime
-from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Request
+from models.conversation import PrivateMessage, PrivateMessageResponse, MessageStatusBatch, ConversationStatusUpdate
+from services.message_service import private_message_repository
+from services.receipt_service import receipt_service
+from services.resource_versions import resource_versions, conversation, conversations
+from websocket_manager import manager
 
 router = APIRouter(prefix="/private", tags=["private_chat"])
-private_messages_collection = db["private_messages"]
 
 @router.post("/send")
 async def send_private_message(message: PrivateMessage):
-    new_message = {
-        "sender_id": message.sender_id,
-        "receiver_id": message.receiver_id,
-        "text": message.text,
-        "message_type": message.message_type,
-        "media_url": message.media_url,
-        "timestamp": datetime.utcnow(),
-        "status": "sent"
-    }
+    """Send a private message"""
+    response = await private_message_repository.insert(
+        message.sender_id,
+        message.receiver_id,
+        message.text,
+        message.message_type,
+        message.media_url
+    )
     
-    result = await private_messages_collection.insert_one(new_message)
+    await resource_versions.message_changed(message.sender_id, message.receiver_id)
+    # Push to the receiver and to the sender's other devices
+    await manager.notify_users({"type": "message", "message": response}, message.receiver_id, message.sender_id)
     
-    return {
-        "id": str(result.inserted_id),
-        "sender_id": message.sender_id,
-        "receiver_id": message.receiver_id,
-        "text": message.text,
-        "message_type": message.message_type,
-        "media_url": message.media_url,
-        "timestamp": new_message["timestamp"],
-        "status": "sent"
-    }
+    return response
 
 @router.get("/messages/{user_id}/{contact_id}")
-async def get_private_messages(user_id: str, contact_id: str, limit: int = 50):
-    messages = []
-    
-    cursor = private_messages_collection.find({
-        "$or": [
-            {"sender_id": user_id, "receiver_id": contact_id},
-            {"sender_id": contact_id, "receiver_id": user_id}
-        ]
-    }).sort("timestamp", 1).limit(limit)
-    
-    async for msg in cursor:
-        messages.append({
-            "id": str(msg["_id"]),
-            "sender_id": msg["sender_id"],
-            "receiver_id": msg["receiver_id"],
-            "text": msg["text"],
-            "message_type": msg.get("message_type", "text"),
-            "media_url": msg.get("media_url"),
-            "timestamp": msg["timestamp"],
-            "status": msg.get("status", "sent")
-        })
-    
-    return messages
+async def get_private_messages(request: Request, user_id: str, contact_id: str, limit: int = 50):
+    """Get messages between two users; 304 if unchanged since the client's ETag"""
+    return await resource_versions.respond(
+        request,
+        conversation(user_id, contact_id),
+        lambda: private_message_repository.list_between(user_id, contact_id, limit)
+    )
 
 @router.put("/messages/{message_id}/status")
 async def update_message_status(message_id: str, status: str):
-    result = await private_messages_collection.update_one(
-        {"_id": ObjectId(message_id)},
-        {"$set": {"status": status}}
-    )
+    """Update message status (delivered/read)"""
+    try:
+        updated = await receipt_service.mark_one(message_id, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if result.modified_count == 0:
+    if not updated:
         raise HTTPException(status_code=404, detail="Message not found")
     
     return {"message": "Status updated"}
 
-@router.get("/conversations/{user_id}")
-async def get_conversations(user_id: str):
-    pipeline = [
-        {
-            "$match": {
-                "$or": [
-                    {"sender_id": user_id},
-                    {"receiver_id": user_id}
-                ]
-            }
-        },
-        {
-            "$sort": {"timestamp": -1}
-        },
-        {
-            "$group": {
-                "_id": {
-                    "$cond": [
-                        {"$eq": ["$sender_id", user_id]},
-                        "$receiver_id",
-                        "$sender_id"
-                    ]
-                },
-                "last_message": {"$first": "$text"},
-                "last_message_time": {"$first": "$timestamp"},
-                "unread_count": {
-                    "$sum": {
-                        "$cond": [
-                            {
-                                "$and": [
-                                    {"$eq": ["$receiver_id", user_id]},
-                                    {"$ne": ["$status", "read"]}
-                                ]
-                            },
-                            1,
-                            0
-                        ]
-                    }
-                }
-            }
-        }
-    ]
+@router.put("/messages/status")
+async def update_message_status_batch(update: MessageStatusBatch):
+    """Update status for a list of messages addressed to one user"""
+    try:
+        updated = await receipt_service.mark_many(update.user_id, update.message_ids, update.status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    conversations = []
-    async for conv in private_messages_collection.aggregate(pipeline):
-        from database import users_collection
-        contact = await users_collection.find_one({"_id": ObjectId(conv["_id"])})
-        
-        conversations.append({
-            "contact_id": conv["_id"],
-            "contact_username": contact["username"] if contact else "Unknown",
-            "last_message": conv["last_message"],
-            "last_message_time": conv["last_message_time"],
-            "unread_count": conv["unread_count"]
-        })
+    return {"message": "Status updated", "updated": updated}
+
+@router.put("/messages/{user_id}/{contact_id}/status")
+async def update_conversation_status(user_id: str, contact_id: str, update: ConversationStatusUpdate):
+    """Mark everything from contact to user up to a message id"""
+    try:
+        updated = await receipt_service.mark_range(user_id, contact_id, update.status, update.up_to_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return conversations
\ No newline at end of file
+    return {"message": "Status updated", "updated": updated}
+
+@router.get("/conversations/{user_id}")
+async def get_conversations(request: Request, user_id: str):
+    """Get all conversations for a user with last message; 304 if unchanged since the client's ETag"""
+    return await resource_versions.respond(
+        request,
+        conversations(user_id),
+        lambda: private_message_repository.conversations(user_id)
+    )
@@ -0,0 +1,290 @@
+from typing import Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+from bson import Binary, ObjectId
+from database import (
+    with_history_reads,
+    messages_collection,
+    private_messages_collection,
+    ai_messages_collection,
+    messages_archive_collection,
+    private_messages_archive_collection,
+    ai_messages_archive_collection
+)
+import asyncio
+import bson
+import logging
+import os
+import time
+import zlib
+
+logger = logging.getLogger("nexchat.archive")
+
+
+def pair_key(user_id: str, contact_id: str) -> str:
+    """Archive group for a 1:1 conversation, the same whichever side asks"""
+    return ":".join(sorted((user_id, contact_id)))
+
+
+def _private_group_query(group: str) -> dict:
+    first, second = group.split(":", 1)
+    return {
+        "$or": [
+            {"sender_id": first, "receiver_id": second},
+            {"sender_id": second, "receiver_id": first}
+        ]
+    }
+
+
+class ArchiveSource:
+    """A hot collection, its archive, and how its documents are grouped for reads"""
+
+    __slots__ = ("name", "hot", "archive", "group_expr", "group_query", "keep_latest", "hold_query", "has_segments")
+
+    def __init__(
+        self,
+        name: str,
+        hot,
+        archive,
+        group_expr,
+        group_query: Callable[[str], dict],
+        keep_latest: bool = False,
+        hold_query: Optional[dict] = None
+    ):
+        self.name = name
+        self.hot = hot
+        self.archive = archive
+        # Aggregation expression giving a document's group, e.g. "$room"
+        self.group_expr = group_expr
+        self.group_query = group_query
+        # Leave each group's newest document hot (conversation lists aggregate over hot data only)
+        self.keep_latest = keep_latest
+        # Documents that must stay hot; archival of a group stops at the oldest match
+        self.hold_query = hold_query
+        # Assume segments exist until the archive collection has been checked
+        self.has_segments = True
+
+
+class ArchiveService:
+    """
+    Moves aged messages out of the hot collections into compressed segments
+
+    Each segment holds up to ARCHIVE_BATCH_SIZE consecutive documents of one
+    group (a room, a conversation or a user's AI history). The documents are
+    stored as zlib-compressed BSON in `<collection>_archive`. Documents are
+    selected by _id age, so the sweep uses the _id index. Since only the
+    oldest documents move, everything archived for a group is older than
+    everything still hot, which lets history reads simply continue into the
+    archive once hot data runs out. An unread private message stays hot,
+    together with everything after it in its conversation, so unread counts
+    and receipts never have to look in the archive.
+    """
+
+    def __init__(self):
+        self.archive_after_days = float(os.getenv("ARCHIVE_AFTER_DAYS", "0"))  # 0 disables archival
+        self.batch_size = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+        self.max_groups = int(os.getenv("ARCHIVE_MAX_GROUPS_PER_RUN", "500"))
+        self.interval = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+        self.compression_level = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "6"))
+        self.upload_dir = os.getenv("UPLOAD_DIR", "uploads")
+        # Filename prefix -> hours to keep; generated TTS audio is only fetched right after creation
+        self.upload_ttls = {"tts_": float(os.getenv("TTS_TTL_HOURS", "24"))}
+        self.sources: Dict[str, ArchiveSource] = {
+            source.name: source for source in (
+                ArchiveSource(
+                    "messages",
+                    messages_collection,
+                    messages_archive_collection,
+                    "$room",
+                    lambda group: {"room": group}
+                ),
+                ArchiveSource(
+                    "private_messages",
+                    private_messages_collection,
+                    private_messages_archive_collection,
+                    {"$cond": [
+                        {"$lt": ["$sender_id", "$receiver_id"]},
+                        {"$concat": ["$sender_id", ":", "$receiver_id"]},
+                        {"$concat": ["$receiver_id", ":", "$sender_id"]}
+                    ]},
+                    _private_group_query,
+                    keep_latest=True,
+                    # Unread messages feed unread counts and mark_range, which only look at hot data
+                    hold_query={"status": {"$ne": "read"}}
+                ),
+                ArchiveSource(
+                    "ai_messages",
+                    ai_messages_collection,
+                    ai_messages_archive_collection,
+                    "$user_id",
+                    lambda group: {"user_id": group}
+                )
+            )
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def _encode(self, docs: List[dict]) -> Binary:
+        return Binary(zlib.compress(bson.encode({"docs": docs}), self.compression_level))
+
+    @staticmethod
+    def _decode(data: bytes) -> List[dict]:
+        return bson.decode(zlib.decompress(data))["docs"]
+
+    async def _archive_group(self, source: ArchiveSource, group: str, cutoff: ObjectId) -> int:
+        query = source.group_query(group)
+        upper = cutoff
+        if source.keep_latest:
+            newest = await source.hot.find_one(query, {"_id": 1}, sort=[("_id", -1)])
+            if newest is None:
+                return 0
+            upper = min(upper, newest["_id"])
+        if source.hold_query is not None:
+            held = await source.hot.find_one({**query, **source.hold_query}, {"_id": 1}, sort=[("_id", 1)])
+            if held is not None:
+                upper = min(upper, held["_id"])
+
+        moved = 0
+        while True:
+            docs = await source.hot.find({**query, "_id": {"$lt": upper}}).sort("_id", 1).limit(self.batch_size).to_list(None)
+            if not docs:
+                return moved
+            # Keyed by the first document, so a rerun after a crash replaces the segment instead of duplicating it
+            await source.archive.replace_one({"_id": str(docs[0]["_id"])}, {
+                "_id": str(docs[0]["_id"]),
+                "group": group,
+                "first_id": docs[0]["_id"],
+                "last_id": docs[-1]["_id"],
+                "count": len(docs),
+                "archived_at": datetime.utcnow(),
+                "data": self._encode(docs)
+            }, upsert=True)
+            await source.hot.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+            source.has_segments = True
+            moved += len(docs)
+
+    async def archive_source(self, source: ArchiveSource, older_than: timedelta) -> int:
+        """Archive one collection's documents older than the given age; returns how many moved"""
+        cutoff = ObjectId.from_datetime(datetime.utcnow() - older_than)
+        pipeline = [
+            {"$match": {"_id": {"$lt": cutoff}}},
+            {"$group": {"_id": source.group_expr}},
+            {"$limit": self.max_groups}
+        ]
+        groups = [group["_id"] async for group in source.hot.aggregate(pipeline)]
+        moved = 0
+        for group in groups:
+            if group is not None:
+                moved += await self._archive_group(source, group, cutoff)
+        return moved
+
+    async def run_once(self) -> dict:
+        """One archival pass over every source plus the upload TTL sweep"""
+        result = {}
+        if self.archive_after_days > 0:
+            older_than = timedelta(days=self.archive_after_days)
+            for name, source in self.sources.items():
+                result[name] = await self.archive_source(source, older_than)
+        result["uploads_deleted"] = await asyncio.to_thread(self.prune_uploads)
+        return result
+
+    def prune_uploads(self) -> int:
+        """Delete transient files in the upload directory past their TTL"""
+        now = time.time()
+        deleted = 0
+        try:
+            entries = list(os.scandir(self.upload_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            for prefix, hours in self.upload_ttls.items():
+                if hours > 0 and entry.name.startswith(prefix) and entry.is_file():
+                    try:
+                        if now - entry.stat().st_mtime > hours * 3600:
+                            os.remove(entry.path)
+                            deleted += 1
+                    except FileNotFoundError:
+                        pass
+        return deleted
+
+    async def read(
+        self,
+        source_name: str,
+        group: str,
+        limit: int,
+        before_id: Optional[ObjectId] = None,
+        oldest_first: bool = False,
+        primary: bool = False
+    ) -> List[dict]:
+        """
+        Read archived documents of one group
+
+        Args:
+            source_name: Hot collection name, e.g. "messages"
+            group: Group key (room id, pair_key() or user id)
+            limit: Maximum documents to return
+            before_id: Only documents older than this id (newest-first reads)
+            oldest_first: Start from the oldest archived document instead of the newest
+            primary: Read from the primary instead of the history read preference
+
+        Returns:
+            Full documents, oldest first if oldest_first, otherwise newest first
+        """
+        source = self.sources[source_name]
+        # With archival off and nothing archived earlier, the busiest reads skip this round trip
+        if limit <= 0 or (self.archive_after_days <= 0 and not source.has_segments):
+            return []
+        archive = source.archive
+        if not primary:
+            archive = with_history_reads(archive)
+        query = {"group": group}
+        if before_id is not None:
+            query["first_id"] = {"$lt": before_id}
+        # Segments of a group never overlap, so first_id order is document order
+        cursor = archive.find(query, {"data": 1}).sort("first_id", 1 if oldest_first else -1)
+
+        docs: List[dict] = []
+        async for segment in cursor:
+            segment_docs = self._decode(segment["data"])
+            if before_id is not None:
+                segment_docs = [doc for doc in segment_docs if doc["_id"] < before_id]
+            if not oldest_first:
+                segment_docs.reverse()
+            docs.extend(segment_docs[:limit - len(docs)])
+            if len(docs) >= limit:
+                break
+        return docs
+
+    async def refresh_segment_flags(self):
+        """Note which archives hold any segments, from collection metadata"""
+        for source in self.sources.values():
+            source.has_segments = await source.archive.estimated_document_count() > 0
+
+    async def _archive_loop(self):
+        try:
+            await self.refresh_segment_flags()
+        except Exception as e:
+            logger.warning("Could not check archive collections: %s", e)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                result = await self.run_once()
+                if any(result.values()):
+                    logger.info("Archive pass: %s", result)
+            except Exception as e:
+                logger.warning("Archive pass failed: %s", e)
+
+    def start(self):
+        """Start the periodic archival task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._archive_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Singleton instance
+archive_service = ArchiveService()
@@ -0,0 +1,93 @@
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from config import COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br over gzip when the client accepts it; honours q=0 refusals"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 1.0
+        if q > 0:
+            accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli for whole-body text responses over COMPRESSION_MIN_BYTES
+
+    Streamed responses (files, media) pass through untouched; so do small
+    bodies, where the framing overhead outweighs the savings.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk shows whether it is worth compressing
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            held, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=held.setdefault("headers", []))
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or len(body) < COMPRESSION_MIN_BYTES
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(held)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(held)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,304 @@
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from models.records import GroupMessageRecord
+from database import (
+    with_history_reads,
+    conversations_collection,
+    conversation_members_collection,
+    conversation_messages_collection
+)
+from websocket_manager import manager
+import asyncio
+import os
+import time
+
+
+class GroupService:
+    """
+    Group conversations
+
+    Each message is stored once in conversation_messages, whatever the group
+    size. Unread state is a per-member read pointer (the last message id the
+    member has seen) rather than a status on every message, so a send is one
+    insert and one group update, and marking read is one update. Unread
+    counts are computed from the pointer on demand, capped at
+    GROUP_UNREAD_CAP. Membership checks always query the (conversation_id,
+    user_id) index. Cached member sets are only used to pick who gets a
+    live push. They expire after GROUP_MEMBER_CACHE_TTL seconds, so a change
+    made on another worker reaches fan-out within that window.
+    """
+
+    MESSAGE_PROJECTION = {
+        "conversation_id": 1,
+        "sender_id": 1,
+        "text": 1,
+        "message_type": 1,
+        "media_url": 1,
+        "timestamp": 1
+    }
+
+    def __init__(self):
+        self.max_members = int(os.getenv("GROUP_MAX_MEMBERS", "1000"))
+        self.unread_cap = int(os.getenv("GROUP_UNREAD_CAP", "99"))
+        self.cache_size = int(os.getenv("GROUP_MEMBER_CACHE", "1000"))
+        self.cache_ttl = float(os.getenv("GROUP_MEMBER_CACHE_TTL", "5"))
+        # conversation_id -> (expiry, member ids); least recently used first
+        self._members: "OrderedDict[str, Tuple[float, FrozenSet[str]]]" = OrderedDict()
+        self.history_reads = with_history_reads(conversation_messages_collection)
+
+    def _object_id(self, value: str) -> ObjectId:
+        try:
+            return ObjectId(value)
+        except (InvalidId, TypeError):
+            raise ValueError(f"Invalid id: {value}")
+
+    @staticmethod
+    def to_dict(msg: dict) -> dict:
+        return {
+            "id": str(msg["_id"]),
+            "conversation_id": msg["conversation_id"],
+            "sender_id": msg["sender_id"],
+            "text": msg["text"],
+            "message_type": msg.get("message_type", "text"),
+            "media_url": msg.get("media_url"),
+            "timestamp": msg["timestamp"]
+        }
+
+    @staticmethod
+    def _summary(group: dict, unread_count: int = 0) -> dict:
+        return {
+            "id": str(group["_id"]),
+            "name": group["name"],
+            "created_by": group["created_by"],
+            "member_count": group.get("member_count", 0),
+            "last_message": group.get("last_message"),
+            "updated_at": group.get("updated_at"),
+            "unread_count": unread_count
+        }
+
+    def _member_doc(self, conversation_id: str, user_id: str, role: str = "member") -> dict:
+        return {
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "role": role,
+            "joined_at": datetime.utcnow(),
+            # Anything sent before joining counts as read
+            "last_read_id": ObjectId()
+        }
+
+    def _invalidate(self, conversation_id: str):
+        self._members.pop(conversation_id, None)
+
+    async def members(self, conversation_id: str) -> FrozenSet[str]:
+        """Member ids of a group (empty if it does not exist)"""
+        cursor = conversation_members_collection.find({"conversation_id": conversation_id}, {"user_id": 1})
+        return frozenset([member["user_id"] async for member in cursor])
+
+    async def _recipients(self, conversation_id: str) -> FrozenSet[str]:
+        """Members for live delivery; may lag a membership change by up to cache_ttl"""
+        now = time.monotonic()
+        cached = self._members.get(conversation_id)
+        if cached is not None and cached[0] > now:
+            self._members.move_to_end(conversation_id)
+            return cached[1]
+
+        members = await self.members(conversation_id)
+        self._members[conversation_id] = (now + self.cache_ttl, members)
+        self._members.move_to_end(conversation_id)
+        if len(self._members) > self.cache_size:
+            self._members.popitem(last=False)
+        return members
+
+    async def is_member(self, conversation_id: str, user_id: str) -> bool:
+        """Authoritative check for access; never served from the cache"""
+        member = await conversation_members_collection.find_one(
+            {"conversation_id": conversation_id, "user_id": user_id},
+            {"_id": 1}
+        )
+        return member is not None
+
+    async def get(self, conversation_id: str) -> Optional[dict]:
+        try:
+            group = await conversations_collection.find_one({"_id": self._object_id(conversation_id), "type": "group"})
+        except ValueError:
+            return None
+        return self._summary(group) if group else None
+
+    async def create(self, name: str, creator_id: str, member_ids: List[str]) -> dict:
+        """Create a group; the creator is its owner and always a member"""
+        member_ids = [user_id for user_id in dict.fromkeys(member_ids) if user_id != creator_id]
+        if len(member_ids) + 1 > self.max_members:
+            raise ValueError(f"Groups are limited to {self.max_members} members")
+
+        now = datetime.utcnow()
+        group = {
+            "type": "group",
+            "name": name,
+            "created_by": creator_id,
+            "created_at": now,
+            "updated_at": now,
+            "member_count": len(member_ids) + 1,
+            "last_message": None
+        }
+        result = await conversations_collection.insert_one(group)
+        group["_id"] = result.inserted_id
+        conversation_id = str(result.inserted_id)
+
+        await conversation_members_collection.insert_many(
+            [self._member_doc(conversation_id, creator_id, "owner")]
+            + [self._member_doc(conversation_id, user_id) for user_id in member_ids]
+        )
+        summary = self._summary(group)
+        await manager.notify_users({"type": "group_added", "group": summary}, creator_id, *member_ids)
+        return summary
+
+    async def add_members(self, conversation_id: str, user_ids: List[str]) -> int:
+        """Add users to a group; existing members are left as they are. Returns how many joined"""
+        current = await self.members(conversation_id)
+        new_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in current]
+        if not new_ids:
+            return 0
+        if len(current) + len(new_ids) > self.max_members:
+            raise ValueError(f"Groups are limited to {self.max_members} members")
+
+        # Upserts, so a concurrent add of the same user cannot create a second membership
+        result = await conversation_members_collection.bulk_write([
+            UpdateOne(
+                {"conversation_id": conversation_id, "user_id": user_id},
+                {"$setOnInsert": self._member_doc(conversation_id, user_id)},
+                upsert=True
+            )
+            for user_id in new_ids
+        ], ordered=False)
+        added = result.upserted_count
+        self._invalidate(conversation_id)
+        if added:
+            group = await conversations_collection.find_one_and_update(
+                {"_id": ObjectId(conversation_id)},
+                {"$inc": {"member_count": added}},
+                return_document=ReturnDocument.AFTER
+            )
+            await manager.notify_users({"type": "group_added", "group": self._summary(group)}, *new_ids)
+        return added
+
+    async def remove_member(self, conversation_id: str, user_id: str) -> bool:
+        result = await conversation_members_collection.delete_one({"conversation_id": conversation_id, "user_id": user_id})
+        self._invalidate(conversation_id)
+        if not result.deleted_count:
+            return False
+
+        await conversations_collection.update_one({"_id": ObjectId(conversation_id)}, {"$inc": {"member_count": -1}})
+        await manager.notify_users({"type": "group_removed", "conversation_id": conversation_id}, user_id)
+        return True
+
+    async def send(
+        self,
+        conversation_id: str,
+        sender_id: str,
+        text: str,
+        message_type: str = "text",
+        media_url: Optional[str] = None
+    ) -> dict:
+        """Store a message once and push it to the members that are online"""
+        new_message = {
+            "conversation_id": conversation_id,
+            "sender_id": sender_id,
+            "text": text,
+            "message_type": message_type,
+            "media_url": media_url,
+            "timestamp": datetime.utcnow()
+        }
+        result = await conversation_messages_collection.insert_one(new_message)
+        new_message["_id"] = result.inserted_id
+        response = self.to_dict(new_message)
+
+        await asyncio.gather(
+            conversations_collection.update_one({"_id": ObjectId(conversation_id)}, {"$set": {
+                "updated_at": new_message["timestamp"],
+                "last_message": {
+                    "id": response["id"],
+                    "sender_id": sender_id,
+                    "text": text,
+                    "timestamp": new_message["timestamp"]
+                }
+            }}),
+            # The sender has read their own message
+            conversation_members_collection.update_one(
+                {"conversation_id": conversation_id, "user_id": sender_id},
+                {"$max": {"last_read_id": result.inserted_id}}
+            )
+        )
+        await manager.notify_users({"type": "group_message", "message": response}, *await self._recipients(conversation_id))
+        return response
+
+    async def history(self, conversation_id: str, limit: int = 50, before_id: Optional[str] = None) -> List[GroupMessageRecord]:
+        """Latest messages (optionally older than before_id), returned oldest first"""
+        query = {"conversation_id": conversation_id}
+        if before_id:
+            query["_id"] = {"$lt": self._object_id(before_id)}
+
+        cursor = self.history_reads.find(query, self.MESSAGE_PROJECTION).sort("_id", -1).limit(limit)
+        messages = [GroupMessageRecord.from_doc(msg) async for msg in cursor]
+        messages.reverse()
+        return messages
+
+    async def mark_read(self, conversation_id: str, user_id: str, up_to_id: str) -> bool:
+        """
+        Move a member's read pointer forward
+
+        Args:
+            conversation_id: Group the messages belong to
+            user_id: Member who read them
+            up_to_id: Newest message id seen; a pointer never moves backwards
+
+        Returns:
+            False if the user is not a member
+        """
+        result = await conversation_members_collection.update_one(
+            {"conversation_id": conversation_id, "user_id": user_id},
+            {"$max": {"last_read_id": self._object_id(up_to_id)}}
+        )
+        if not result.matched_count:
+            return False
+
+        # Clears the badge on the reader's other devices
+        await manager.notify_users({
+            "type": "group_read",
+            "conversation_id": conversation_id,
+            "up_to_id": up_to_id
+        }, user_id)
+        return True
+
+    async def unread_count(self, conversation_id: str, user_id: str, last_read_id: ObjectId) -> int:
+        return await conversation_messages_collection.count_documents({
+            "conversation_id": conversation_id,
+            "_id": {"$gt": last_read_id},
+            "sender_id": {"$ne": user_id}
+        }, limit=self.unread_cap)
+
+    async def list_for_user(self, user_id: str) -> List[dict]:
+        """A user's groups with last message and unread count, most recently active first"""
+        cursor = conversation_members_collection.find({"user_id": user_id}, {"conversation_id": 1, "last_read_id": 1})
+        pointers: Dict[str, ObjectId] = {
+            member["conversation_id"]: member["last_read_id"] async for member in cursor
+        }
+        if not pointers:
+            return []
+
+        groups = await conversations_collection.find(
+            {"_id": {"$in": [ObjectId(conversation_id) for conversation_id in pointers]}}
+        ).to_list(None)
+        counts = await asyncio.gather(*[
+            self.unread_count(str(group["_id"]), user_id, pointers[str(group["_id"])])
+            for group in groups
+        ])
+        summaries = [self._summary(group, count) for group, count in zip(groups, counts)]
+        summaries.sort(key=lambda group: group["updated_at"], reverse=True)
+        return summaries
+
+# Singleton instance
+group_service = GroupService()
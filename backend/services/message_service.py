@@ -0,0 +1,318 @@
+from typing import Dict, List, Optional
+from datetime import datetime
+from bson import ObjectId
+from models.records import PrivateMessageRecord, RoomMessageRecord, AIMessageRecord
+from database import (
+    with_history_reads,
+    private_messages_collection,
+    messages_collection,
+    ai_messages_collection,
+    users_collection
+)
+from services.archive_service import archive_service, pair_key
+
+
+class PrivateMessageRepository:
+    """Query shapes and document conversion for 1:1 private messages"""
+
+    LIST_PROJECTION = {
+        "sender_id": 1,
+        "receiver_id": 1,
+        "text": 1,
+        "message_type": 1,
+        "media_url": 1,
+        "timestamp": 1,
+        "status": 1
+    }
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def to_dict(msg: dict) -> dict:
+        return {
+            "id": str(msg["_id"]),
+            "sender_id": msg["sender_id"],
+            "receiver_id": msg["receiver_id"],
+            "text": msg["text"],
+            "message_type": msg.get("message_type", "text"),
+            "media_url": msg.get("media_url"),
+            "timestamp": msg["timestamp"],
+            "status": msg.get("status", "sent")
+        }
+
+    @staticmethod
+    def between(user_id: str, contact_id: str) -> dict:
+        return {
+            "$or": [
+                {"sender_id": user_id, "receiver_id": contact_id},
+                {"sender_id": contact_id, "receiver_id": user_id}
+            ]
+        }
+
+    async def insert(
+        self,
+        sender_id: str,
+        receiver_id: str,
+        text: str,
+        message_type: str = "text",
+        media_url: Optional[str] = None
+    ) -> dict:
+        new_message = {
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "text": text,
+            "message_type": message_type,
+            "media_url": media_url,
+            "timestamp": datetime.utcnow(),
+            "status": "sent"
+        }
+        result = await self.collection.insert_one(new_message)
+        new_message["_id"] = result.inserted_id
+        return self.to_dict(new_message)
+
+    async def list_between(self, user_id: str, contact_id: str, limit: int = 50) -> List[PrivateMessageRecord]:
+        """Oldest first; archived messages come before anything still hot"""
+        archived = await archive_service.read(
+            "private_messages",
+            pair_key(user_id, contact_id),
+            limit,
+            oldest_first=True,
+            primary=True
+        )
+        messages = [PrivateMessageRecord.from_doc(msg) for msg in archived]
+        if len(messages) >= limit:
+            return messages
+
+        query = self.between(user_id, contact_id)
+        if archived:
+            # Skip anything caught mid-move between the tiers
+            query = {"$and": [query, {"_id": {"$gt": archived[-1]["_id"]}}]}
+        # Primary: this list is served under an ETag, and a lagging secondary would pin stale data to it
+        cursor = self.collection.find(query, self.LIST_PROJECTION).sort("timestamp", 1).limit(limit - len(messages))
+        messages.extend([PrivateMessageRecord.from_doc(msg) async for msg in cursor])
+        return messages
+
+    async def set_status(self, message_id: ObjectId, status: str, behind: dict) -> Optional[dict]:
+        """Set status on one message; returns sender/receiver ids or None if nothing changed"""
+        return await self.collection.find_one_and_update(
+            {"_id": message_id, "status": behind},
+            {"$set": {"status": status}},
+            projection={"sender_id": 1, "receiver_id": 1}
+        )
+
+    async def set_status_range(
+        self,
+        reader_id: str,
+        contact_id: str,
+        status: str,
+        behind: dict,
+        up_to_id: Optional[ObjectId] = None
+    ) -> int:
+        query = {
+            "sender_id": contact_id,
+            "receiver_id": reader_id,
+            "status": behind
+        }
+        if up_to_id is not None:
+            query["_id"] = {"$lte": up_to_id}
+
+        result = await self.collection.update_many(query, {"$set": {"status": status}})
+        return result.modified_count
+
+    async def set_status_many(
+        self,
+        reader_id: str,
+        message_ids: List[ObjectId],
+        status: str,
+        behind: dict
+    ) -> int:
+        result = await self.collection.update_many(
+            {"_id": {"$in": message_ids}, "receiver_id": reader_id, "status": behind},
+            {"$set": {"status": status}}
+        )
+        return result.modified_count
+
+    async def senders_of(self, reader_id: str, message_ids: List[ObjectId]) -> List[str]:
+        return await self.collection.distinct(
+            "sender_id",
+            {"_id": {"$in": message_ids}, "receiver_id": reader_id}
+        )
+
+    async def conversations(self, user_id: str) -> List[dict]:
+        pipeline = [
+            {
+                "$match": {
+                    "$or": [
+                        {"sender_id": user_id},
+                        {"receiver_id": user_id}
+                    ]
+                }
+            },
+            {
+                "$sort": {"timestamp": -1}
+            },
+            {
+                "$group": {
+                    "_id": {
+                        "$cond": [
+                            {"$eq": ["$sender_id", user_id]},
+                            "$receiver_id",
+                            "$sender_id"
+                        ]
+                    },
+                    "last_message": {"$first": "$text"},
+                    "last_message_time": {"$first": "$timestamp"},
+                    "unread_count": {
+                        "$sum": {
+                            "$cond": [
+                                {
+                                    "$and": [
+                                        {"$eq": ["$receiver_id", user_id]},
+                                        {"$ne": ["$status", "read"]}
+                                    ]
+                                },
+                                1,
+                                0
+                            ]
+                        }
+                    }
+                }
+            }
+        ]
+
+        groups = [conv async for conv in self.collection.aggregate(pipeline)]
+        usernames = await self._usernames([conv["_id"] for conv in groups])
+
+        return [
+            {
+                "contact_id": conv["_id"],
+                "contact_username": usernames.get(conv["_id"], "Unknown"),
+                "last_message": conv["last_message"],
+                "last_message_time": conv["last_message_time"],
+                "unread_count": conv["unread_count"]
+            }
+            for conv in groups
+        ]
+
+    async def _usernames(self, user_ids: List[str]) -> Dict[str, str]:
+        """Resolve usernames with one $in query instead of one find_one per contact"""
+        oids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+        if not oids:
+            return {}
+        cursor = users_collection.find({"_id": {"$in": oids}}, {"username": 1})
+        return {str(user["_id"]): user["username"] async for user in cursor}
+
+
+class RoomMessageRepository:
+    """Query shapes and document conversion for public room messages"""
+
+    LIST_PROJECTION = {"room": 1, "sender": 1, "sender_id": 1, "text": 1, "timestamp": 1}
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.history_reads = with_history_reads(collection)
+
+    @staticmethod
+    def to_dict(msg: dict) -> dict:
+        return {
+            "id": str(msg["_id"]),
+            "room": msg["room"],
+            "sender": msg["sender"],
+            "sender_id": msg["sender_id"],
+            "text": msg["text"],
+            "timestamp": msg["timestamp"].isoformat()
+        }
+
+    async def insert(self, room_id: str, sender: str, sender_id: str, text: str) -> dict:
+        new_message = {
+            "room": room_id,
+            "sender": sender,
+            "sender_id": sender_id,
+            "text": text,
+            "timestamp": datetime.utcnow()
+        }
+        result = await self.collection.insert_one(new_message)
+        new_message["_id"] = result.inserted_id
+        return self.to_dict(new_message)
+
+    async def list_after(self, room_id: str, after_id: ObjectId, limit: int) -> List[dict]:
+        """Messages newer than after_id, oldest first; reads the primary so nothing just written is missed"""
+        cursor = self.collection.find(
+            {"room": room_id, "_id": {"$gt": after_id}},
+            self.LIST_PROJECTION
+        ).sort("_id", 1).limit(limit)
+        return [self.to_dict(msg) async for msg in cursor]
+
+    async def history(self, room_id: str, limit: int = 50, before_id: Optional[ObjectId] = None) -> List[RoomMessageRecord]:
+        """Latest messages (optionally older than before_id), returned oldest first"""
+        query = {"room": room_id}
+        if before_id is not None:
+            query["_id"] = {"$lt": before_id}
+
+        cursor = self.history_reads.find(query, self.LIST_PROJECTION).sort("_id", -1).limit(limit)
+        messages = [RoomMessageRecord.from_doc(msg) async for msg in cursor]
+        if len(messages) < limit:
+            # Paged past the hot data; continue into the archive
+            oldest = ObjectId(messages[-1].id) if messages else before_id
+            archived = await archive_service.read("messages", room_id, limit - len(messages), before_id=oldest)
+            messages.extend(RoomMessageRecord.from_doc(msg) for msg in archived)
+        messages.reverse()
+        return messages
+
+
+class AIMessageRepository:
+    """Query shapes and document conversion for AI assistant history"""
+
+    LIST_PROJECTION = {"role": 1, "content": 1, "timestamp": 1}
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def to_dict(msg: dict) -> dict:
+        return {
+            "id": str(msg["_id"]),
+            "role": msg["role"],
+            "content": msg["content"],
+            "timestamp": msg["timestamp"]
+        }
+
+    async def insert(self, user_id: str, role: str, content: str) -> str:
+        result = await self.collection.insert_one({
+            "user_id": user_id,
+            "role": role,
+            "content": content,
+            "timestamp": datetime.utcnow()
+        })
+        return str(result.inserted_id)
+
+    async def recent_context(self, user_id: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Last messages as chat-completion turns, oldest first"""
+        cursor = self.collection.find(
+            {"user_id": user_id},
+            {"role": 1, "content": 1}
+        ).sort("timestamp", -1).limit(limit)
+        history = [{"role": msg["role"], "content": msg["content"]} async for msg in cursor]
+        history.reverse()
+        return history
+
+    async def history(self, user_id: str, limit: int = 50) -> List[AIMessageRecord]:
+        """Oldest first; archived messages come before anything still hot"""
+        archived = await archive_service.read("ai_messages", user_id, limit, oldest_first=True, primary=True)
+        messages = [AIMessageRecord.from_doc(msg) for msg in archived]
+        if len(messages) >= limit:
+            return messages
+
+        query = {"user_id": user_id}
+        if archived:
+            query["_id"] = {"$gt": archived[-1]["_id"]}
+        # Primary, as for private messages: served under an ETag
+        cursor = self.collection.find(query, self.LIST_PROJECTION).sort("timestamp", 1).limit(limit - len(messages))
+        messages.extend([AIMessageRecord.from_doc(msg) async for msg in cursor])
+        return messages
+
+# Singleton instances
+private_message_repository = PrivateMessageRepository(private_messages_collection)
+room_message_repository = RoomMessageRepository(messages_collection)
+ai_message_repository = AIMessageRepository(ai_messages_collection)
@@ -0,0 +1,288 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from pymongo import monitoring
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("nexchat.metrics")
+
+# Seconds; covers sub-millisecond in-memory work up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Driver callbacks arrive on executor threads
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or computed at scrape time from a callback"""
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+    ):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                items = list(self._callback().items())
+            except Exception as e:
+                logger.warning("Gauge %s callback failed: %s", self.name, e)
+                items = []
+        else:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in items
+        ]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labels: str) -> _Timer:
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = self.header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, callback))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "nexchat_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+db_command_duration = registry.histogram(
+    "nexchat_db_command_duration_seconds", "MongoDB command latency", ("command", "collection", "outcome")
+)
+broadcast_duration = registry.histogram(
+    "nexchat_ws_broadcast_duration_seconds", "Time to fan a frame out to a room", ("kind",)
+)
+broadcast_fanout = registry.histogram(
+    "nexchat_ws_broadcast_fanout", "Sockets per broadcast", ("kind",),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+openai_duration = registry.histogram(
+    "nexchat_openai_request_duration_seconds", "OpenAI API latency", ("operation",)
+)
+rate_limited = registry.counter(
+    "nexchat_rate_limited_total", "Requests or frames rejected by a rate limit", ("scope",)
+)
+event_loop_lag = registry.histogram(
+    "nexchat_event_loop_lag_seconds", "Delay between when the lag probe should wake and when it did"
+)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command; labels by command and collection to keep cardinality low"""
+
+    def __init__(self):
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event):
+        # The collection name is the value of the command's first key, e.g. {"find": "users"}
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop(event.request_id, "")
+        db_command_duration.observe(event.duration_micros / 1e6, event.command_name, collection, outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests by route template (not raw path) to bound label cardinality"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], path, status[0])
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag; optionally turns on asyncio slow-callback logging"""
+
+    def __init__(self):
+        self.interval = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+        self.warn_seconds = float(os.getenv("METRICS_LOOP_LAG_WARN_MS", "200")) / 1000
+        self.slow_callback_ms = float(os.getenv("METRICS_SLOW_CALLBACK_MS", "0"))
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            event_loop_lag.observe(lag)
+            if lag > self.warn_seconds:
+                logger.warning("Event loop lagged %.1f ms", lag * 1000)
+
+    def start(self):
+        if self.slow_callback_ms > 0:
+            # Debug mode has a real cost, so this is opt-in
+            loop = asyncio.get_running_loop()
+            loop.slow_callback_duration = self.slow_callback_ms / 1000
+            loop.set_debug(True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+command_metrics = CommandMetrics()
+loop_lag_monitor = LoopLagMonitor()
@@ -1,8 +1,6 @@
 from typing import Optional, List, Dict, Any
+from fastapi import HTTPException
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 class OpenAIService:
     """Service for integrating with OpenAI API for AI assistant functionality"""
@@ -11,6 +9,19 @@ class OpenAIService:
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
         self.max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", "1000"))
+        self._client = None
+    
+    def get_client(self):
+        """Build the SDK client on first use; importing the openai package alone takes about half a second"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+    
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
         
     async def generate_response(
         self, 
@@ -85,3 +96,9 @@ class OpenAIService:
 
 # Singleton instance
 openai_service = OpenAIService()
+
+def get_openai_client():
+    """FastAPI dependency returning the shared OpenAI client; override it in tests"""
+    if not openai_service.api_key:
+        raise HTTPException(status_code=503, detail="AI is not configured")
+    return openai_service.get_client()
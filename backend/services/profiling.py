@@ -0,0 +1,275 @@
+from typing import Deque, Dict, List, Optional
+from collections import Counter, deque
+from datetime import datetime
+from fnmatch import fnmatch
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("nexchat.profiling")
+
+MAX_STACK_DEPTH = 128
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _describe(frame) -> str:
+    return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+
+def _await_site(coro) -> str:
+    """
+    Where a suspended request is waiting: the innermost frame of our own code,
+    followed by the library frame it is blocked in if that is different, e.g.
+    "list_between (message_service.py:84) -> to_list (cursor.py:120)"
+    """
+    app_frame = leaf = None
+    current = coro
+    while current is not None:
+        frame = getattr(current, "cr_frame", None) or getattr(current, "gi_frame", None)
+        if frame is not None:
+            leaf = frame
+            if frame.f_code.co_filename.startswith(APP_DIR):
+                app_frame = frame
+        current = getattr(current, "cr_await", None) or getattr(current, "gi_yieldfrom", None)
+    if leaf is None:
+        return "unknown"
+    if app_frame is None or app_frame is leaf:
+        return _describe(leaf)
+    return f"{_describe(app_frame)} -> {_describe(leaf)}"
+
+
+def _fold(frame) -> str:
+    """Collapse a thread stack into one flame-graph line, root first"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestTrace:
+    """Wall-clock breakdown of one request: time its own code ran on the loop vs. time spent awaiting"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.route = ""
+        self.status = 0
+        self.started_at = datetime.utcnow()
+        self.wall = 0.0
+        self.running = 0.0
+        self.steps = 0
+        # await site -> [count, total seconds, max seconds]
+        self.awaits: Dict[str, list] = {}
+        self.folded: Counter = Counter()
+        self.samples = 0
+
+    def ran(self, seconds: float):
+        self.running += seconds
+        self.steps += 1
+
+    def waited(self, site: str, seconds: float):
+        entry = self.awaits.get(site)
+        if entry is None:
+            entry = self.awaits[site] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "wall_ms": round(self.wall * 1000, 3),
+            "running_ms": round(self.running * 1000, 3),
+            "awaiting_ms": round(max(0.0, self.wall - self.running) * 1000, 3),
+            "steps": self.steps,
+            "samples": self.samples
+        }
+
+    def to_dict(self) -> dict:
+        awaits = sorted(self.awaits.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            **self.summary(),
+            "awaits": [
+                {"site": site, "count": count, "total_ms": round(total * 1000, 3), "max_ms": round(longest * 1000, 3)}
+                for site, (count, total, longest) in awaits
+            ],
+            "folded": dict(self.folded.most_common())
+        }
+
+    def folded_text(self) -> str:
+        """Brendan Gregg's collapsed-stack format, for flamegraph.pl or speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.folded.most_common()) + "\n"
+
+
+class _TracedCoroutine:
+    """Drives a coroutine step by step, timing each resume and where it suspended"""
+
+    def __init__(self, coro, trace: RequestTrace):
+        self.coro = coro
+        self.trace = trace
+
+    def __await__(self):
+        coro, trace = self.coro, self.trace
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                if error is not None:
+                    yielded = coro.throw(error)
+                else:
+                    yielded = coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                trace.ran(time.perf_counter() - start)
+
+            site = _await_site(coro)
+            suspended = time.perf_counter()
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+            trace.waited(site, time.perf_counter() - suspended)
+
+
+class StackSampler:
+    """Samples the event loop thread's stack on a side thread, py-spy style"""
+
+    def __init__(self, thread_id: int, interval: float, trace: RequestTrace):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.trace = trace
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.trace.folded[_fold(frame)] += 1
+                self.trace.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class Profiler:
+    """
+    Opt-in request profiler
+
+    A request is profiled if it carries the profile header with the right
+    token, or if its path matches one of the route patterns and wins the
+    sampling draw. Only one request is profiled at a time. The finished
+    profiles are kept in a ring buffer.
+    """
+
+    def __init__(self):
+        self.token = os.getenv("PROFILE_TOKEN", "")
+        self.header = os.getenv("PROFILE_HEADER", "x-profile").lower().encode()
+        self.routes = [route for route in os.getenv("PROFILE_ROUTES", "").split(",") if route]
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.interval = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+        self.profiles: Deque[RequestTrace] = deque(maxlen=int(os.getenv("PROFILE_BUFFER_SIZE", "50")))
+        self._busy = False
+
+    def configure(self, routes: Optional[List[str]] = None, sample_rate: Optional[float] = None):
+        """Change what is sampled without a restart (affects this worker only)"""
+        if routes is not None:
+            self.routes = routes
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, sample_rate))
+
+    def settings(self) -> dict:
+        return {
+            "routes": self.routes,
+            "sample_rate": self.sample_rate,
+            "sample_interval_ms": self.interval * 1000,
+            "buffer_size": self.profiles.maxlen,
+            "stored": len(self.profiles),
+            "header_enabled": bool(self.token)
+        }
+
+    def check_token(self, token: Optional[str]) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+
+    def should_profile(self, scope) -> bool:
+        if self._busy:
+            return False
+        if self.token:
+            for name, value in scope.get("headers", ()):
+                if name == self.header:
+                    return self.check_token(value.decode("latin-1"))
+        if self.sample_rate <= 0:
+            return False
+        if self.routes and not any(fnmatch(scope["path"], route) for route in self.routes):
+            return False
+        return random.random() < self.sample_rate
+
+    def get(self, profile_id: str) -> Optional[RequestTrace]:
+        for trace in self.profiles:
+            if trace.id == profile_id:
+                return trace
+        return None
+
+    def list(self) -> List[dict]:
+        return [trace.summary() for trace in reversed(self.profiles)]
+
+    async def run(self, app, scope, receive, send):
+        """Run the request under the profiler; the response carries an X-Profile-Id header"""
+        self._busy = True
+        trace = RequestTrace(scope["method"], scope["path"])
+        sampler = StackSampler(threading.get_ident(), self.interval, trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", trace.id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await _TracedCoroutine(app(scope, receive, send_wrapper), trace)
+        finally:
+            trace.wall = time.perf_counter() - start
+            sampler.stop()
+            route = scope.get("route")
+            trace.route = getattr(route, "path", None) or ""
+            self.profiles.append(trace)
+            self._busy = False
+            logger.info("Profiled %s %s in %.1f ms (%s)", trace.method, trace.path, trace.wall * 1000, trace.id)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware handing selected HTTP requests to the profiler; a no-op for the rest"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        await profiler.run(self.app, scope, receive, send)
+
+# Singleton instance
+profiler = Profiler()
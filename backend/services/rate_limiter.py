@@ -0,0 +1,86 @@
+from typing import Optional
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+from services.metrics import rate_limited
+from config import WS_USER_RATE, WS_USER_BURST, AI_RATE, AI_BURST, UPLOAD_RATE, UPLOAD_BURST
+import math
+import time
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second up to `burst`"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float = 1.0) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def retry_after(self, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available"""
+        if self.rate <= 0:
+            return math.inf
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+
+def client_key(connection) -> str:
+    """Rate-limit identity of an HTTP request or WebSocket: the peer address"""
+    return connection.client.host if connection.client else "unknown"
+
+
+class RateLimiter:
+    """Token buckets keyed by user/client, kept in an LRU with a hard cap so memory stays bounded"""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> bucket; least recently used first
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, key: str, cost: float = 1.0) -> Optional[float]:
+        """Spend tokens for key; returns None if allowed, else seconds to wait"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                # The least recently seen key has usually refilled anyway; at worst it starts over full
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        if bucket.take(cost):
+            return None
+        return bucket.retry_after(cost)
+
+    def dependency(self, scope: str):
+        """FastAPI dependency that rejects over-budget requests with 429"""
+        async def check(request: Request):
+            # The client address, not the user_id parameter: a caller could rotate that for a fresh bucket
+            retry_after = self.take(f"{scope}:{client_key(request)}")
+            if retry_after is not None:
+                rate_limited.inc(scope)
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+        return check
+
+# Shared limiter instances
+ws_user_limiter = RateLimiter(WS_USER_RATE, WS_USER_BURST)
+ai_limiter = RateLimiter(AI_RATE, AI_BURST)
+upload_limiter = RateLimiter(UPLOAD_RATE, UPLOAD_BURST)
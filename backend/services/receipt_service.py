@@ -0,0 +1,186 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+from bson import ObjectId
+from bson.errors import InvalidId
+from services.message_service import private_message_repository
+from services.resource_versions import resource_versions
+from websocket_manager import manager
+
+logger = logging.getLogger("nexchat.receipts")
+
+# Ordered from least to most advanced; a message never moves backwards
+MESSAGE_STATUSES = ("sent", "delivered", "read")
+
+
+class ReceiptService:
+    """Service for delivery/read receipts on private messages"""
+
+    def __init__(self):
+        self.flush_interval = float(os.getenv("RECEIPT_FLUSH_INTERVAL", "1.0"))
+        # (reader_id, contact_id, status) -> highest message id acknowledged
+        self._pending: Dict[Tuple[str, str, str], ObjectId] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def _status_filter(self, status: str) -> dict:
+        """Match only messages that are behind the requested status"""
+        if status not in MESSAGE_STATUSES:
+            raise ValueError(f"Invalid status: {status}")
+        rank = MESSAGE_STATUSES.index(status)
+        return {"$nin": list(MESSAGE_STATUSES[rank:])}
+
+    def _object_id(self, message_id: str) -> ObjectId:
+        try:
+            return ObjectId(message_id)
+        except (InvalidId, TypeError):
+            raise ValueError(f"Invalid message id: {message_id}")
+
+    async def mark_one(self, message_id: str, status: str) -> bool:
+        """Set status on a single message and notify its sender; never moves a message backwards"""
+        msg = await private_message_repository.set_status(
+            self._object_id(message_id),
+            status,
+            self._status_filter(status)
+        )
+        if msg is None:
+            return False
+
+        await resource_versions.message_changed(msg["sender_id"], msg["receiver_id"])
+        await manager.notify_users({
+            "type": "status",
+            "message_id": message_id,
+            "reader_id": msg["receiver_id"],
+            "status": status
+        }, msg["sender_id"])
+        return True
+
+    async def mark_range(
+        self,
+        reader_id: str,
+        contact_id: str,
+        status: str = "read",
+        up_to_id: Optional[str] = None
+    ) -> int:
+        """
+        Mark every message from contact to reader up to a message id
+
+        Args:
+            reader_id: ID of the user receiving the messages
+            contact_id: ID of the user who sent the messages
+            status: Target status (delivered/read)
+            up_to_id: Last message id to include, or None for all
+
+        Returns:
+            Number of messages updated
+        """
+        updated = await private_message_repository.set_status_range(
+            reader_id,
+            contact_id,
+            status,
+            self._status_filter(status),
+            self._object_id(up_to_id) if up_to_id else None
+        )
+        if updated:
+            await resource_versions.message_changed(contact_id, reader_id)
+            await manager.notify_users({
+                "type": "status",
+                "reader_id": reader_id,
+                "up_to_id": up_to_id,
+                "status": status
+            }, contact_id)
+        return updated
+
+    async def mark_many(self, reader_id: str, message_ids: List[str], status: str = "read") -> int:
+        """
+        Mark a list of messages addressed to reader
+
+        Args:
+            reader_id: ID of the user receiving the messages
+            message_ids: IDs of the messages to update
+            status: Target status (delivered/read)
+
+        Returns:
+            Number of messages updated
+        """
+        if not message_ids:
+            return 0
+
+        oids = [self._object_id(message_id) for message_id in message_ids]
+        updated = await private_message_repository.set_status_many(
+            reader_id,
+            oids,
+            status,
+            self._status_filter(status)
+        )
+        if updated:
+            senders = await private_message_repository.senders_of(reader_id, oids)
+            for sender_id in senders:
+                await resource_versions.message_changed(sender_id, reader_id)
+            await manager.notify_users({
+                "type": "status",
+                "reader_id": reader_id,
+                "message_ids": message_ids,
+                "status": status
+            }, *senders)
+        return updated
+
+    def queue(self, reader_id: str, contact_id: str, message_id: str, status: str = "read"):
+        """Buffer a receipt; only the highest id per conversation is kept until the next flush"""
+        self._status_filter(status)
+        self._merge((reader_id, contact_id, status), self._object_id(message_id))
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _merge(self, key: Tuple[str, str, str], oid: ObjectId):
+        current = self._pending.get(key)
+        if current is None or oid > current:
+            self._pending[key] = oid
+
+    async def flush(self) -> int:
+        """Write all buffered receipts, one update_many per conversation"""
+        pending, self._pending = self._pending, {}
+        updated = 0
+        try:
+            while pending:
+                key, oid = next(iter(pending.items()))
+                reader_id, contact_id, status = key
+                try:
+                    updated += await self.mark_range(reader_id, contact_id, status, str(oid))
+                except Exception as e:
+                    # Keep the receipt for the next flush instead of dropping it
+                    self._merge(key, oid)
+                    logger.warning("Error flushing receipts: %s", e)
+                del pending[key]
+        finally:
+            # Cancelled mid-batch: put back what was not written yet
+            for key, oid in pending.items():
+                self._merge(key, oid)
+        return updated
+
+    async def _flush_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self):
+        """Start the periodic flush task"""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic flush task, letting an in-flight flush finish, and write what is left"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+# Singleton instance
+receipt_service = ReceiptService()
@@ -0,0 +1,97 @@
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import Request, Response
+from database import resource_versions_collection
+from services.serialization import FastJSONResponse
+import asyncio
+import uuid
+import zlib
+
+
+def conversation(user_id: str, contact_id: str) -> Tuple[str, str, str]:
+    """Both directions of a 1:1 chat share one version"""
+    first, second = sorted((user_id, contact_id))
+    return ("conversation", first, second)
+
+
+def conversations(user_id: str) -> Tuple[str, str]:
+    return ("conversations", user_id)
+
+
+def contacts(user_id: str) -> Tuple[str, str]:
+    return ("contacts", user_id)
+
+
+def ai_history(user_id: str) -> Tuple[str, str]:
+    return ("ai_history", user_id)
+
+
+class ResourceVersions:
+    """
+    Write counters behind the ETags on list endpoints
+
+    Every write that changes a list bumps that list's counter, in the same
+    places that push the change over WebSockets. The bump comes after the
+    data write, and the counters live in MongoDB, so every worker sees
+    them. A conditional GET can then be answered with 304 after reading one
+    small document by _id from the primary, without running the list query.
+    Each counter document gets a random epoch when it is created. If a
+    counter is ever lost, old tags miss instead of matching a restarted
+    count.
+    """
+
+    @staticmethod
+    def _id(key: Tuple[str, ...]) -> str:
+        return "|".join(key)
+
+    async def bump(self, *keys: Tuple[str, ...]):
+        await asyncio.gather(*[
+            resource_versions_collection.update_one(
+                {"_id": self._id(key)},
+                {"$inc": {"version": 1}, "$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+                upsert=True
+            )
+            for key in keys
+        ])
+
+    async def message_changed(self, sender_id: str, receiver_id: str):
+        """A private message was sent or its status moved"""
+        await self.bump(conversation(sender_id, receiver_id), conversations(sender_id), conversations(receiver_id))
+
+    @staticmethod
+    def _etag(counter: Optional[dict], variant: str) -> str:
+        epoch, version = (counter["epoch"], counter["version"]) if counter else ("0", 0)
+        # Weak: the same version may go out gzip'd, brotli'd or plain
+        return f'W/"{epoch}-{version}-{zlib.crc32(variant.encode()):x}"'
+
+    async def etag(self, key: Tuple[str, ...], variant: str = "") -> str:
+        return self._etag(await resource_versions_collection.find_one({"_id": self._id(key)}), variant)
+
+    @staticmethod
+    def _matches(request: Request, etag: str) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        tags = [tag.strip() for tag in header.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+    async def respond(self, request: Request, key: Tuple[str, ...], load: Callable[[], Awaitable[Any]]) -> Response:
+        """
+        Answer a list GET, skipping the query when the client's copy is current
+
+        Args:
+            request: Incoming request; its query string is part of the tag
+            key: Resource the list belongs to
+            load: Coroutine function producing the list; must read from the primary
+
+        Returns:
+            304 with no body, or the rendered list with its ETag
+        """
+        # Tag taken before the read: a write racing the query makes the next request refetch
+        etag = await self.etag(key, request.url.query)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if self._matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return FastJSONResponse(await load(), headers=headers)
+
+# Singleton instance
+resource_versions = ResourceVersions()
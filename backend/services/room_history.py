@@ -0,0 +1,71 @@
+from typing import Deque, List, Optional, Tuple
+from collections import OrderedDict, deque
+from fastapi import WebSocket
+from bson import ObjectId
+from bson.errors import InvalidId
+from services.message_service import room_message_repository
+import json
+import os
+
+
+class RoomHistory:
+    """Ring buffer of recent broadcast frames per room, with MongoDB fallback for older gaps"""
+
+    def __init__(self):
+        self.buffer_size = int(os.getenv("ROOM_HISTORY_SIZE", "200"))
+        self.replay_limit = int(os.getenv("ROOM_REPLAY_LIMIT", "500"))
+        self.max_rooms = int(os.getenv("ROOM_HISTORY_ROOMS", "1000"))
+        # room_id -> (message id, rendered frame), oldest first; least recently active room first
+        self._buffers: "OrderedDict[str, Deque[Tuple[ObjectId, str]]]" = OrderedDict()
+
+    def append(self, room_id: str, message_id: str, frame: str):
+        """Remember a frame that was just broadcast"""
+        buffer = self._buffers.get(room_id)
+        if buffer is None:
+            buffer = self._buffers[room_id] = deque(maxlen=self.buffer_size)
+            if len(self._buffers) > self.max_rooms:
+                # Quiet rooms fall back to MongoDB for replay
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(room_id)
+        buffer.append((ObjectId(message_id), frame))
+
+    def since(self, room_id: str, last_id: ObjectId) -> Optional[List[Tuple[ObjectId, str]]]:
+        """Frames newer than last_id, or None if the buffer does not reach back that far"""
+        buffer = self._buffers.get(room_id)
+        if not buffer or last_id < buffer[0][0]:
+            return None
+        return [(oid, frame) for oid, frame in buffer if oid > last_id]
+
+    async def replay(self, websocket: WebSocket, room_id: str, last_id: str) -> Optional[str]:
+        """
+        Send everything the client missed after last_id, in order
+
+        Args:
+            websocket: Socket to replay to (held by the manager meanwhile)
+            room_id: Room being joined
+            last_id: Last message id the client saw
+
+        Returns:
+            Id of the last replayed message, or last_id if nothing was missed
+        """
+        try:
+            after = ObjectId(last_id)
+        except (InvalidId, TypeError):
+            return None
+
+        frames = self.since(room_id, after)
+        if frames is None:
+            messages = await room_message_repository.list_after(room_id, after, self.replay_limit)
+            frames = [(ObjectId(msg["id"]), json.dumps(msg)) for msg in messages]
+            if len(frames) >= self.replay_limit:
+                # Gap too large to replay; tell the client to reload history instead
+                await websocket.send_text(json.dumps({"type": "resync", "room": room_id}))
+
+        for _, frame in frames:
+            await websocket.send_text(frame)
+
+        return str(frames[-1][0]) if frames else last_id
+
+# Singleton instance
+room_history = RoomHistory()
@@ -0,0 +1,38 @@
+from typing import Any
+from dataclasses import is_dataclass, fields
+from datetime import datetime
+from fastapi.responses import Response
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if is_dataclass(value):
+        return {f.name: getattr(value, f.name) for f in fields(value)}
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize records/dicts to JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(content, default=str)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered directly from records, skipping jsonable_encoder"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
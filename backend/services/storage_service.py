@@ -1,85 +1,473 @@
-from typing import Optional, BinaryIO
-import os
+from typing import AsyncIterator, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+import asyncio
 import hashlib
-import shutil
-from dotenv import load_dotenv
+import importlib
+import os
+import uuid
+
+
+def _prefix(*magics: bytes) -> Callable[[bytes], bool]:
+    return lambda head: head.startswith(magics)
+
+
+def _riff(form: bytes) -> Callable[[bytes], bool]:
+    return lambda head: head[:4] == b"RIFF" and head[8:12] == form
+
+
+def _iso_media(head: bytes) -> bool:
+    """MP4/M4A/MOV: first box type at offset 4"""
+    return head[4:8] in (b"ftyp", b"moov", b"mdat", b"wide", b"free")
+
+
+def _mp3(head: bytes) -> bool:
+    # ID3 tag, or a bare MPEG audio frame sync
+    return head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
+
+
+def _text(head: bytes) -> bool:
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the chunk is fine
+        return e.start >= len(head) - 3 and e.reason == "unexpected end of data"
+    return True
+
+
+_JPEG = _prefix(b"\xff\xd8\xff")
+_EBML = _prefix(b"\x1a\x45\xdf\xa3")
+_ZIP = _prefix(b"PK\x03\x04", b"PK\x05\x06")
+
+# Category -> extension -> check on the first bytes. The one list of what may be uploaded;
+# order matters where an extension is in two categories (.webm is audio, as voice clips
+# are, unless media_type=video is sent).
+MEDIA_TYPES: Dict[str, Dict[str, Callable[[bytes], bool]]] = {
+    "image": {
+        ".jpg": _JPEG,
+        ".jpeg": _JPEG,
+        ".png": _prefix(b"\x89PNG\r\n\x1a\n"),
+        ".gif": _prefix(b"GIF87a", b"GIF89a"),
+        ".webp": _riff(b"WEBP")
+    },
+    "audio": {
+        ".mp3": _mp3,
+        ".wav": _riff(b"WAVE"),
+        ".ogg": _prefix(b"OggS"),
+        ".m4a": _iso_media,
+        ".webm": _EBML
+    },
+    "video": {
+        ".mp4": _iso_media,
+        ".webm": _EBML,
+        ".mov": _iso_media
+    },
+    "document": {
+        ".pdf": _prefix(b"%PDF-"),
+        ".doc": _prefix(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),
+        ".docx": _ZIP,
+        ".txt": _text,
+        ".zip": _ZIP
+    }
+}
+
+# Older clients send media_type=file for documents
+MEDIA_TYPE_ALIASES = {"file": "document"}
+
+DEFAULT_MAX_SIZES = {
+    "image": 10 * 1024 * 1024,
+    "audio": 25 * 1024 * 1024,
+    "video": 50 * 1024 * 1024,
+    "document": 25 * 1024 * 1024
+}
+
+
+class UploadRejected(ValueError):
+    """An upload failed validation; status_code is what the API should answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SignatureScanner:
+    """
+    Local stand-in for an antivirus engine
+
+    Only knows the EICAR test signature, which is enough to exercise the
+    rejection path end to end. A real engine plugs in through MEDIA_SCANNER
+    ("module:factory") as any object with a session() method whose result
+    has update(chunk) and verdict() -> threat name or None.
+    """
+
+    # Assembled at import so this file does not itself trip scanners
+    SIGNATURES = {
+        "EICAR-Test-File": b"X5O!P%@AP[4\\PZX54(P^)7CC)7}$" + b"EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*"
+    }
+
+    def session(self) -> "SignatureSession":
+        return SignatureSession(self.SIGNATURES)
+
+
+class SignatureSession:
+    def __init__(self, signatures: Dict[str, bytes]):
+        self.signatures = signatures
+        self.overlap = max(len(signature) for signature in signatures.values()) - 1
+        self.tail = b""
+        self.found: Optional[str] = None
+
+    def update(self, chunk: bytes):
+        if self.found:
+            return
+        # Carry the end of the previous chunk so a signature split across chunks still matches
+        window = self.tail + chunk
+        for name, signature in self.signatures.items():
+            if signature in window:
+                self.found = name
+                return
+        self.tail = window[-self.overlap:]
+
+    def verdict(self) -> Optional[str]:
+        return self.found
+
+
+class _Ingest:
+    """One upload on its way through the worker pool: written, hashed and scanned per chunk"""
+
+    __slots__ = ("path", "file", "sha256", "scan", "size")
+
+    def __init__(self, path: str, scan):
+        self.path = path
+        self.file = None
+        self.sha256 = hashlib.sha256()
+        self.scan = scan
+        self.size = 0
+
+    def feed(self, chunk: bytes):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, "wb")
+        self.file.write(chunk)
+        self.sha256.update(chunk)
+        self.scan.update(chunk)
+
+    def finish(self) -> Optional[str]:
+        self.file.close()
+        return self.scan.verdict()
+
+    def publish(self, destination: str):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # A rename on the same filesystem: readers see the whole file or nothing
+        os.replace(self.path, destination)
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _FormFile:
+    """
+    One file field pulled out of a multipart/form-data body as it arrives
+
+    The parser callbacks only collect headers and buffer the field's bytes;
+    chunks() hands those on in chunk_size pieces, so the first piece holds
+    enough of the file for the magic-byte check however the body was split
+    on the wire.
+    """
+
+    def __init__(self, body: AsyncIterator[bytes], content_type: str, field: str, chunk_size: int):
+        kind, options = parse_options_header(content_type)
+        if kind != b"multipart/form-data" or not options.get(b"boundary"):
+            raise UploadRejected("Expected a multipart/form-data upload", 415)
+        self.body = body.__aiter__()
+        self.field = field.encode()
+        self.chunk_size = chunk_size
+        self.filename: Optional[str] = None
+        self.buffer = bytearray()
+        self.in_file = False
+        self.complete = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._header = b""
+        self._value = b""
+        self.parser = MultipartParser(options[b"boundary"], callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header.lower()] = self._value
+        self._header = self._value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if self.filename is None and options.get(b"name") == self.field and b"filename" in options:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self.in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self.in_file:
+            self.buffer += data[start:end]
+
+    def _on_part_end(self):
+        if self.in_file:
+            self.in_file = False
+            self.complete = True
+
+    async def _pump(self) -> bool:
+        """Feed the next piece of the body to the parser; False once the body is exhausted"""
+        try:
+            data = await self.body.__anext__()
+        except StopAsyncIteration:
+            return False
+        try:
+            self.parser.write(data)
+        except MultipartParseError:
+            raise UploadRejected("Malformed multipart body")
+        return True
+
+    async def open(self) -> str:
+        """Read until the field's headers have arrived; returns the client's filename"""
+        while self.filename is None:
+            if not await self._pump():
+                raise UploadRejected(f"No {self.field.decode()} field in upload")
+        return self.filename
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            while len(self.buffer) >= self.chunk_size:
+                chunk = bytes(self.buffer[:self.chunk_size])
+                del self.buffer[:self.chunk_size]
+                yield chunk
+            if self.complete:
+                break
+            if not await self._pump():
+                raise UploadRejected("Upload ended before the file did")
+        if self.buffer:
+            yield bytes(self.buffer)
+            self.buffer.clear()
 
-load_dotenv()
 
 class StorageService:
-    """Service for handling file uploads and media storage"""
-    
+    """
+    Service for handling file uploads and media storage
+
+    store_upload() parses the multipart body itself instead of taking an
+    UploadFile, which Starlette only hands over once the whole body has been
+    spooled. Checks therefore run as the file arrives. The first chunk's
+    magic bytes must match the extension, each category has its own size
+    limit, and every chunk is hashed and fed to the scanner on a worker
+    thread while it is written to the staging directory. A failed check ends
+    the request without reading the rest of the body. Only a file that
+    passes all of these is moved to its public name. Staging sits outside
+    the upload directory, which is served as-is under /uploads. It must be
+    on the same filesystem so the move is a rename.
+    """
+
     def __init__(self):
         self.upload_dir = os.getenv("UPLOAD_DIR", "uploads")
-        self.max_file_size = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB default
-        self.allowed_extensions = set([
-            'jpg', 'jpeg', 'png', 'gif', 'webp',  # Images
-            'mp4', 'webm', 'mov',  # Videos
-            'mp3', 'wav', 'ogg', 'm4a',  # Audio
-            'pdf', 'doc', 'docx', 'txt'  # Documents
-        ])
-        
-        # Create upload directory if it doesn't exist
-        Path(self.upload_dir).mkdir(parents=True, exist_ok=True)
-    
+        self.staging_dir = os.getenv(
+            "UPLOAD_STAGING_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(self.upload_dir)), ".upload-staging")
+        )
+        self.chunk_size = int(os.getenv("UPLOAD_CHUNK_SIZE", "262144"))
+        self.max_sizes = {
+            category: int(os.getenv(f"MAX_{category.upper()}_SIZE", str(default)))
+            for category, default in DEFAULT_MAX_SIZES.items()
+        }
+        self.allowed_extensions = set(
+            ext.lstrip(".") for extensions in MEDIA_TYPES.values() for ext in extensions
+        )
+        self.scan_workers = int(os.getenv("UPLOAD_SCAN_WORKERS", "4"))
+        self.scanner_path = os.getenv("MEDIA_SCANNER", "")
+        self._scanner = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def scanner(self):
+        """Scanner from MEDIA_SCANNER, or the local signature scanner; loaded on first upload"""
+        if self._scanner is None:
+            if self.scanner_path:
+                module, _, factory = self.scanner_path.partition(":")
+                self._scanner = getattr(importlib.import_module(module), factory)()
+            else:
+                self._scanner = SignatureScanner()
+        return self._scanner
+
+    @scanner.setter
+    def scanner(self, scanner):
+        self._scanner = scanner
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.scan_workers, thread_name_prefix="upload")
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def category_for(self, ext: str, media_type: Optional[str] = None) -> str:
+        """Media category for an extension, checked against the type the client claimed"""
+        categories = [category for category, extensions in MEDIA_TYPES.items() if ext in extensions]
+        if not categories:
+            raise UploadRejected("File type not allowed")
+        if media_type is None:
+            return categories[0]
+        media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        if media_type not in categories:
+            raise UploadRejected(f"{ext} is not a valid {media_type} file")
+        return media_type
+
     def is_allowed_file(self, filename: str) -> bool:
         """Check if file extension is allowed"""
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
-    
+
     def generate_filename(self, original_filename: str) -> str:
         """Generate unique filename using timestamp and hash"""
         timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
         name, ext = os.path.splitext(original_filename)
         hash_val = hashlib.md5(f"{name}{timestamp}".encode()).hexdigest()[:8]
         return f"{timestamp}_{hash_val}{ext}"
-    
+
+    def published_path(self, filename: str) -> Optional[str]:
+        """Path of a published upload, or None for names that could reach outside it"""
+        if not filename or filename.startswith(".") or "/" in filename or os.sep in filename:
+            return None
+        return os.path.join(self.upload_dir, filename)
+
+    async def _ingest(self, chunks: AsyncIterator[bytes], ext: str, category: str) -> _Ingest:
+        """Validate, hash, scan and stage a stream of chunks; raises UploadRejected on the first failure"""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        limit = self.max_sizes[category]
+        ingest = _Ingest(os.path.join(self.staging_dir, f"{uuid.uuid4().hex}.part"), self.scanner.session())
+        try:
+            async for chunk in chunks:
+                if ingest.size == 0 and not MEDIA_TYPES[category][ext](chunk):
+                    raise UploadRejected(f"File content does not match {ext}")
+                ingest.size += len(chunk)
+                if ingest.size > limit:
+                    raise UploadRejected(f"File too large (max {limit // (1024 * 1024)}MB for {category})", 413)
+                await loop.run_in_executor(pool, ingest.feed, chunk)
+            if ingest.size == 0:
+                raise UploadRejected("Empty file")
+            threat = await loop.run_in_executor(pool, ingest.finish)
+            if threat:
+                raise UploadRejected(f"File rejected by scanner: {threat}", 422)
+        except BaseException:
+            await loop.run_in_executor(pool, ingest.discard)
+            raise
+        return ingest
+
+    async def _publish(self, ingest: _Ingest, destination: str):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._get_pool(), ingest.publish, destination)
+        except BaseException:
+            await loop.run_in_executor(self._get_pool(), ingest.discard)
+            raise
+
+    async def store_upload(
+        self,
+        body: AsyncIterator[bytes],
+        content_type: str,
+        media_type: Optional[str] = None,
+        field: str = "file"
+    ) -> dict:
+        """
+        Validate a multipart upload while it streams to disk, then publish it
+
+        Args:
+            body: The raw request body, e.g. request.stream()
+            content_type: The request's Content-Type, which carries the boundary
+            media_type: Category the client says it is sending, if any
+            field: Form field holding the file; other fields are skipped
+
+        Returns:
+            Dictionary with the public name, URL, size, category and SHA-256
+        """
+        form = _FormFile(body, content_type, field, self.chunk_size)
+        ext = os.path.splitext(await form.open())[1].lower()
+        category = self.category_for(ext, media_type)
+        ingest = await self._ingest(form.chunks(), ext, category)
+        unique_filename = f"{uuid.uuid4()}_{datetime.utcnow().timestamp()}{ext}"
+        await self._publish(ingest, os.path.join(self.upload_dir, unique_filename))
+
+        return {
+            "filename": unique_filename,
+            "url": f"/media/files/{unique_filename}",
+            "size": ingest.size,
+            "type": category,
+            "file_type": category,
+            "sha256": ingest.sha256.hexdigest()
+        }
+
     async def save_file(
-        self, 
+        self,
         file_data: bytes,
         filename: str,
         user_id: str
     ) -> dict:
         """
         Save uploaded file to storage
-        
+
         Args:
             file_data: File content as bytes
             filename: Original filename
             user_id: ID of user uploading the file
-            
+
         Returns:
             Dictionary with file metadata
         """
-        if not self.is_allowed_file(filename):
-            raise ValueError(f"File type not allowed: {filename}")
-        
-        if len(file_data) > self.max_file_size:
-            raise ValueError(f"File size exceeds maximum allowed size")
-        
-        # Generate unique filename
+        ext = os.path.splitext(filename)[1].lower()
+        category = self.category_for(ext)
+
+        async def chunks():
+            view = memoryview(file_data)
+            for start in range(0, len(view), self.chunk_size):
+                yield bytes(view[start:start + self.chunk_size])
+
+        ingest = await self._ingest(chunks(), ext, category)
+
+        # Generate unique filename inside the user's directory
         unique_filename = self.generate_filename(filename)
-        
-        # Create user directory
-        user_dir = os.path.join(self.upload_dir, user_id)
-        Path(user_dir).mkdir(parents=True, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(user_dir, unique_filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_data)
-        
+        file_path = os.path.join(self.upload_dir, user_id, unique_filename)
+        await self._publish(ingest, file_path)
+
         return {
             "filename": unique_filename,
             "original_filename": filename,
             "path": file_path,
-            "size": len(file_data),
+            "size": ingest.size,
+            "sha256": ingest.sha256.hexdigest(),
             "uploaded_at": datetime.utcnow(),
             "user_id": user_id
         }
-    
+
     async def get_file_url(self, user_id: str, filename: str) -> str:
         """
         Get URL for accessing a file
@@ -87,12 +475,12 @@ class StorageService:
         Args:
             user_id: ID of file owner
             filename: Name of the file
-            
+        
         Returns:
             URL to access the file
         """
         return f"/media/{user_id}/{filename}"
-    
+
     async def delete_file(self, user_id: str, filename: str) -> bool:
         """
         Delete a file from storage
@@ -100,7 +488,7 @@ class StorageService:
         Args:
             user_id: ID of file owner
             filename: Name of the file to delete
-            
+        
         Returns:
             True if file was deleted, False otherwise
         """
@@ -113,21 +501,14 @@ class StorageService:
         except Exception as e:
             print(f"Error deleting file: {e}")
             return False
-    
+
     def get_file_type(self, filename: str) -> str:
         """Determine file type category"""
-        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-        
-        if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-            return 'image'
-        elif ext in ['mp4', 'webm', 'mov']:
-            return 'video'
-        elif ext in ['mp3', 'wav', 'ogg', 'm4a']:
-            return 'audio'
-        elif ext in ['pdf', 'doc', 'docx', 'txt']:
-            return 'document'
-        else:
+        ext = os.path.splitext(filename)[1].lower()
+        try:
+            return self.category_for(ext)
+        except UploadRejected:
             return 'other'
 
 # Singleton instance
-storage_service = StorageService()
+storage_service = StorageService()
\ No newline at end of file
@@ -0,0 +1,217 @@
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from tempfile import SpooledTemporaryFile
+from fastapi import UploadFile
+from database import transcription_jobs_collection
+from services.metrics import openai_duration
+import asyncio
+import io
+import logging
+import os
+import uuid
+import wave
+
+READ_CHUNK = 64 * 1024
+
+logger = logging.getLogger("nexchat.transcription")
+
+
+@dataclass
+class TranscriptionJob:
+    id: str
+    user_id: str
+    status: str = "queued"  # queued -> running -> done/failed
+    text: Optional[str] = None
+    error: Optional[str] = None
+    chunks_total: int = 0
+    chunks_done: int = 0
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "text": self.text,
+            "error": self.error,
+            "chunks_total": self.chunks_total,
+            "chunks_done": self.chunks_done
+        }
+
+
+class TranscriptionService:
+    """
+    Bounded async queue in front of Whisper, fed from spooled buffers instead of temp files
+
+    A job runs on the worker that accepted the upload, and self.jobs only
+    holds that worker's jobs in flight. Status, chunk progress and the final
+    text are written to the transcription_jobs collection as the job moves,
+    so a poll can land on any worker. Documents expire TRANSCRIBE_JOB_TTL
+    seconds after their last update.
+    """
+
+    def __init__(self):
+        self.model = os.getenv("WHISPER_MODEL", "whisper-1")
+        self.language = os.getenv("WHISPER_LANGUAGE", "en")
+        self.max_concurrency = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+        self.max_pending = int(os.getenv("TRANSCRIBE_MAX_PENDING", "32"))
+        self.max_bytes = int(os.getenv("TRANSCRIBE_MAX_BYTES", str(25 * 1024 * 1024)))
+        self.spool_bytes = int(os.getenv("TRANSCRIBE_SPOOL_BYTES", str(1024 * 1024)))
+        self.chunk_seconds = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "60"))
+        self.sync_wait = float(os.getenv("TRANSCRIBE_SYNC_WAIT", "30"))
+        self.job_ttl = float(os.getenv("TRANSCRIBE_JOB_TTL", "600"))
+        self.jobs: Dict[str, TranscriptionJob] = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def buffer_upload(self, upload: UploadFile) -> SpooledTemporaryFile:
+        """Copy an upload into a buffer that stays in memory for small clips and spills anonymously for large ones"""
+        spool = SpooledTemporaryFile(max_size=self.spool_bytes)
+        size = 0
+        while True:
+            chunk = await upload.read(READ_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_bytes:
+                spool.close()
+                raise ValueError(f"Audio exceeds maximum size of {self.max_bytes} bytes")
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    def pending(self) -> int:
+        return len(self.jobs)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Current state of a job started on any worker"""
+        doc = await transcription_jobs_collection.find_one({"_id": job_id})
+        if doc is None:
+            return None
+        return {
+            "job_id": doc["_id"],
+            "status": doc["status"],
+            "text": doc.get("text"),
+            "error": doc.get("error"),
+            "chunks_total": doc.get("chunks_total", 0),
+            "chunks_done": doc.get("chunks_done", 0)
+        }
+
+    async def _save(self, job: TranscriptionJob):
+        await transcription_jobs_collection.update_one({"_id": job.id}, {"$set": {
+            "user_id": job.user_id,
+            "status": job.status,
+            "text": job.text,
+            "error": job.error,
+            "chunks_total": job.chunks_total,
+            "chunks_done": job.chunks_done,
+            "expires_at": datetime.utcnow() + timedelta(seconds=self.job_ttl)
+        }}, upsert=True)
+
+    async def submit(self, client, audio: BinaryIO, filename: str, user_id: str = "") -> TranscriptionJob:
+        """
+        Queue a transcription job
+
+        Args:
+            client: OpenAI client used for the Whisper calls
+            audio: Buffer holding the audio; closed when the job finishes
+            filename: Original filename, used by Whisper to detect the format
+            user_id: ID of the user who uploaded the clip
+
+        Returns:
+            The queued job
+
+        Raises:
+            OverflowError: If the queue is full
+        """
+        if self.pending() >= self.max_pending:
+            audio.close()
+            raise OverflowError("Transcription queue is full")
+
+        job = TranscriptionJob(id=uuid.uuid4().hex, user_id=user_id)
+        self.jobs[job.id] = job
+        try:
+            # Written before the 202 goes out, so an immediate poll finds it
+            await self._save(job)
+        except Exception:
+            del self.jobs[job.id]
+            audio.close()
+            raise
+        task = asyncio.create_task(self._run(client, job, audio, filename))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _split(self, audio: BinaryIO, filename: str) -> List[Tuple[str, BinaryIO]]:
+        """Split PCM WAV into chunk_seconds pieces; compressed formats are sent whole"""
+        header = audio.read(12)
+        audio.seek(0)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return [(filename, audio)]
+
+        try:
+            source = wave.open(audio, "rb")
+        except (wave.Error, EOFError):
+            # Non-PCM (e.g. IEEE float) or truncated header: the API still accepts it whole
+            audio.seek(0)
+            return [(filename, audio)]
+
+        with source:
+            params = source.getparams()
+            frames_per_chunk = max(1, int(params.framerate * self.chunk_seconds))
+            if params.nframes <= frames_per_chunk:
+                audio.seek(0)
+                return [(filename, audio)]
+
+            name = os.path.splitext(filename)[0]
+            parts = []
+            while True:
+                frames = source.readframes(frames_per_chunk)
+                if not frames:
+                    break
+                part = io.BytesIO()
+                with wave.open(part, "wb") as target:
+                    target.setparams(params)
+                    target.writeframes(frames)
+                part.seek(0)
+                parts.append((f"{name}_{len(parts)}.wav", part))
+            return parts
+
+    async def _transcribe(self, client, job: TranscriptionJob, filename: str, audio: BinaryIO) -> str:
+        async with self._semaphore:
+            # The OpenAI client is synchronous; keep it off the event loop
+            with openai_duration.time("transcription"):
+                transcript = await asyncio.to_thread(
+                    client.audio.transcriptions.create,
+                    model=self.model,
+                    file=(filename, audio),
+                    language=self.language
+                )
+        job.chunks_done += 1
+        await transcription_jobs_collection.update_one({"_id": job.id}, {"$inc": {"chunks_done": 1}})
+        return transcript.text
+
+    async def _run(self, client, job: TranscriptionJob, audio: BinaryIO, filename: str):
+        try:
+            job.status = "running"
+            parts = await asyncio.to_thread(self._split, audio, filename)
+            job.chunks_total = len(parts)
+            await self._save(job)
+            texts = await asyncio.gather(*(self._transcribe(client, job, name, part) for name, part in parts))
+            job.text = " ".join(text.strip() for text in texts if text)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            audio.close()
+            try:
+                await self._save(job)
+            except Exception:
+                logger.exception("Could not record result of transcription job %s", job.id)
+            finally:
+                del self.jobs[job.id]
+                job.done.set()
+
+# Singleton instance
+transcription_service = TranscriptionService()
@@ -1,27 +1,250 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Deque, Dict, Hashable, List, Optional, Set, Tuple
+from collections import deque
+from datetime import datetime
+from config import (
+    WS_MAX_CONNECTIONS,
+    WS_MAX_CONNECTIONS_PER_ROOM,
+    WS_MAX_CONNECTIONS_PER_USER,
+    WS_IDLE_TIMEOUT,
+    WS_IDLE_TICK
+)
+from services.metrics import broadcast_duration, broadcast_fanout
+import asyncio
+import json
+import math
+import time
+
+# Close code for "try again later" when the worker or room is at capacity
+OVERLOADED = 1013
+# Close code used when an idle socket is reaped
+GOING_AWAY = 1001
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule/cancel, one slot visited per tick"""
+
+    def __init__(self, tick: float, slots: int = 64):
+        self.tick = tick
+        self.slots: List[Set[Hashable]] = [set() for _ in range(slots)]
+        self.deadlines: Dict[Hashable, int] = {}
+        self.current = 0
+
+    def schedule(self, key: Hashable, delay: float):
+        self.cancel(key)
+        deadline = self.current + max(1, math.ceil(delay / self.tick))
+        self.deadlines[key] = deadline
+        self.slots[deadline % len(self.slots)].add(key)
+
+    def cancel(self, key: Hashable):
+        deadline = self.deadlines.pop(key, None)
+        if deadline is not None:
+            self.slots[deadline % len(self.slots)].discard(key)
+
+    def advance(self) -> List[Hashable]:
+        """Move one tick forward and return the keys that are due"""
+        self.current += 1
+        slot = self.slots[self.current % len(self.slots)]
+        # Keys more than one revolution out share the slot but are not due yet
+        due = [key for key in slot if self.deadlines[key] <= self.current]
+        for key in due:
+            slot.discard(key)
+            del self.deadlines[key]
+        return due
+
+
+class Connection:
+    __slots__ = ("kind", "key", "last_seen")
+
+    def __init__(self, kind: str, key: str):
+        self.kind = kind
+        self.key = key
+        self.last_seen = time.monotonic()
+
 
 class WebSocketManager:
     def __init__(self):
-        # room_id -> list of websockets
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        # room_id -> set of websockets; empty rooms are removed
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # user_id -> set of websockets on that user's private channel
+        self.user_connections: Dict[str, Set[WebSocket]] = {}
+        # websocket -> (message id, frame) broadcasts queued while history is replayed
+        self.held: Dict[WebSocket, Deque[Tuple[Optional[str], str]]] = {}
+        # websocket -> what it is registered under and its heartbeat state
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.wheel = TimerWheel(WS_IDLE_TICK)
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.connections)
+
+    async def _reject(self, websocket: WebSocket, reason: str) -> bool:
+        # Closing before accept() turns into an HTTP 403 handshake failure; accept first so the client sees 1013
+        await websocket.accept()
+        await websocket.close(code=OVERLOADED, reason=reason)
+        return False
+
+    def _register(self, websocket: WebSocket, kind: str, key: str):
+        self.connections[websocket] = Connection(kind, key)
+        if WS_IDLE_TIMEOUT > 0:
+            self.wheel.schedule(websocket, WS_IDLE_TIMEOUT)
+
+    def _unregister(self, websocket: WebSocket) -> Optional[Connection]:
+        self.wheel.cancel(websocket)
+        self.held.pop(websocket, None)
+        return self.connections.pop(websocket, None)
+
+    async def connect(self, websocket: WebSocket, room_id: str, hold: bool = False) -> bool:
+        """Accept and register a room socket; returns False if it was turned away for capacity"""
+        if self.connection_count >= WS_MAX_CONNECTIONS:
+            return await self._reject(websocket, "Server at capacity")
+        if len(self.active_connections.get(room_id, ())) >= WS_MAX_CONNECTIONS_PER_ROOM:
+            return await self._reject(websocket, "Room at capacity")
 
-    async def connect(self, websocket: WebSocket, room_id: str):
         await websocket.accept()
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = []
-        self.active_connections[room_id].append(websocket)
+        self._register(websocket, "room", room_id)
+        if hold:
+            self.held[websocket] = deque()
+        self.active_connections.setdefault(room_id, set()).add(websocket)
+        return True
 
     def disconnect(self, websocket: WebSocket, room_id: str):
-        if room_id in self.active_connections:
-            self.active_connections[room_id].remove(websocket)
+        """Safe to call more than once and on any exit path"""
+        self._unregister(websocket)
+        connections = self.active_connections.get(room_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
+                del self.active_connections[room_id]
 
-    async def broadcast(self, message: str, room_id: str):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                await connection.send_text(message)
+    async def broadcast(self, message: str, room_id: str, message_id: Optional[str] = None):
+        # Snapshot: sockets may be dropped while we await sends
+        connections = tuple(self.active_connections.get(room_id, ()))
+        broadcast_fanout.observe(len(connections), "room")
+        with broadcast_duration.time("room"):
+            for connection in connections:
+                queue = self.held.get(connection)
+                if queue is not None:
+                    queue.append((message_id, message))
+                    continue
+                try:
+                    await connection.send_text(message)
+                except Exception:
+                    self.disconnect(connection, room_id)
+
+    async def release(self, websocket: WebSocket, after_id: Optional[str] = None):
+        """Deliver broadcasts queued during replay, skipping ones the replay already covered"""
+        queue = self.held.get(websocket, ())
+        while queue:
+            message_id, message = queue.popleft()
+            # ObjectId hex strings have fixed width, so string order is id order
+            if after_id is None or message_id is None or message_id > after_id:
+                await websocket.send_text(message)
+        self.held.pop(websocket, None)
 
     def get_online_count(self, room_id: str) -> int:
-        return len(self.active_connections.get(room_id, []))
+        return len(self.active_connections.get(room_id, ()))
+
+    async def connect_user(self, websocket: WebSocket, user_id: str) -> bool:
+        """Accept and register a private channel socket; returns False if turned away"""
+        if self.connection_count >= WS_MAX_CONNECTIONS:
+            return await self._reject(websocket, "Server at capacity")
+        if len(self.user_connections.get(user_id, ())) >= WS_MAX_CONNECTIONS_PER_USER:
+            return await self._reject(websocket, "Too many connections for user")
+
+        await websocket.accept()
+        self._register(websocket, "user", user_id)
+        self.user_connections.setdefault(user_id, set()).add(websocket)
+        return True
+
+    def disconnect_user(self, websocket: WebSocket, user_id: str):
+        """Safe to call more than once and on any exit path"""
+        self._unregister(websocket)
+        connections = self.user_connections.get(user_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
+                del self.user_connections[user_id]
+
+    async def send_to_user(self, message: str, user_id: str):
+        for connection in tuple(self.user_connections.get(user_id, ())):
+            try:
+                await connection.send_text(message)
+            except Exception:
+                self.disconnect_user(connection, user_id)
+
+    async def notify_users(self, event: dict, *user_ids: str):
+        """Push one event to every live private socket of the given users"""
+        targets = set(user_ids)
+        if len(targets) > len(self.user_connections):
+            # Large audiences (whole groups): walk the online users instead of every member
+            targets = [user_id for user_id in self.user_connections if user_id in targets]
+        message = json.dumps(event, default=_json_default)
+        with broadcast_duration.time("user"):
+            for user_id in targets:
+                await self.send_to_user(message, user_id)
+
+    def is_user_online(self, user_id: str) -> bool:
+        return user_id in self.user_connections
+
+    def touch(self, websocket: WebSocket):
+        """Record inbound traffic; any frame resets the idle timer"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def _drop(self, websocket: WebSocket):
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        if connection.kind == "room":
+            self.disconnect(websocket, connection.key)
+        else:
+            self.disconnect_user(websocket, connection.key)
+
+    async def _check(self, websocket: WebSocket):
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+
+        idle = time.monotonic() - connection.last_seen
+        if idle < WS_IDLE_TIMEOUT:
+            # Traffic since the timer was set; sleep until it would go idle
+            self.wheel.schedule(websocket, WS_IDLE_TIMEOUT - idle)
+            return
+
+        # Liveness is the transport's job (protocol pings); this only enforces the idle limit
+        self._drop(websocket)
+        try:
+            await asyncio.wait_for(websocket.close(code=GOING_AWAY, reason="Idle timeout"), 5)
+        except Exception:
+            pass
+
+    async def _reaper_loop(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            due = self.wheel.advance()
+            if due:
+                await asyncio.gather(*(self._check(websocket) for websocket in due))
+
+    def start_reaper(self):
+        """Start the idle reaper; a no-op while WS_IDLE_TIMEOUT is 0"""
+        if self._reaper_task is None and WS_IDLE_TIMEOUT > 0:
+            self._reaper_task = asyncio.create_task(self._reaper_loop())
+
+    async def stop_reaper(self):
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            try:
+                await self._reaper_task
+            except asyncio.CancelledError:
+                pass
+            self._reaper_task = None
 
-manager = WebSocketManager()
\ No newline at end of file
+manager = WebSocketManager()
@@ -20,6 +20,13 @@ interface Room {
   description: string
 }
 
+const ERROR_NOTICES: Record<string, string> = {
+  rate_limited: 'You are sending messages too fast; wait a moment and try again',
+  frame_too_large: 'Message is too long',
+  invalid_json: 'Message was not sent',
+  invalid_frame: 'Message was not sent'
+}
+
 const Chat = () => {
   const { user } = useAuth()
   const navigate = useNavigate()
@@ -27,6 +34,7 @@ const Chat = () => {
   const [rooms, setRooms] = useState<Room[]>([])
   const [activeRoom, setActiveRoom] = useState('general')
   const [connected, setConnected] = useState(false)
+  const [notice, setNotice] = useState<string | null>(null)
   const wsRef = useRef<WebSocket | null>(null)
 
   useEffect(() => {
@@ -48,6 +56,12 @@ const Chat = () => {
 
     ws.onmessage = (event) => {
       const msg = JSON.parse(event.data)
+      if (msg.type === 'error') {
+        // The server dropped one of our frames; it is not a chat message
+        setNotice(ERROR_NOTICES[msg.code] ?? 'Message was not sent')
+        return
+      }
+      setNotice(null)
       setMessages(prev => [...prev, msg])
     }
 
@@ -143,6 +157,12 @@ const Chat = () => {
 
         <MessageList messages={messages} />
 
+        {notice && (
+          <div style={{ padding: '6px 20px', fontSize: '12px', color: '#e94560' }}>
+            {notice}
+          </div>
+        )}
+
         <MessageInput
           onSendMessage={handleSendMessage}
           disabled={!connected}
@@ -33,4 +33,31 @@ export const updateMessageStatus = async (messageId: string, status: string) =>
   })
   if (!res.ok) throw new Error('Failed to update status')
   return res.json()
-}
\ No newline at end of file
+}
+
+export const updateMessagesStatus = async (userId: string, messageIds: string[], status: string) => {
+  const res = await fetch(`${BASE_URL}/private/messages/status`, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ user_id: userId, message_ids: messageIds, status })
+  })
+  if (!res.ok) throw new Error('Failed to update status')
+  return res.json()
+}
+
+export const markConversationStatus = async (userId: string, contactId: string, status: string, upToId?: string) => {
+  const res = await fetch(`${BASE_URL}/private/messages/${userId}/${contactId}/status`, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ status, up_to_id: upToId ?? null })
+  })
+  if (!res.ok) throw new Error('Failed to update status')
+  return res.json()
+}
+
+
+export const connectPrivateChannel = (userId: string, onEvent: (event: any) => void) => {
+  const ws = new WebSocket(`${BASE_URL.replace(/^http/, 'ws')}/ws/user/${userId}`)
+  ws.onmessage = (e) => onEvent(JSON.parse(e.data))
+  return ws
+}